@@ -1,7 +1,14 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+import asyncio
+import json
 import uuid
+import zipfile
 
-from app.services import storage, openai_hybrid_grading, reports
+from app.services import storage, grading_engine, reports, jobs, batch, metrics, comic_index, model_scheduler, opinion_parsing, quality_gate, idempotency, preprocessing, cpu_pool
 
 router = APIRouter()
 
@@ -11,26 +18,221 @@ async def grade_comic(
     user_id: str = Form(...),
     front: UploadFile = File(...),
     back: UploadFile = File(...),
+    async_job: bool = Form(False),
+    mode: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Header(None),
 ):
+    """
+    Grade a comic from its front/back scans.
+
+    With `async_job=true` the originals are saved, the grade is queued and
+    a 202 with status/result URLs is returned right away.
+    `mode` (local / ai / hybrid / dual / tiered) overrides GRADING_MODE.
+
+    Retries don't grade twice: a request with the same `Idempotency-Key`
+    header, or the same user + front/back content + mode, while the first is
+    still running waits for it and gets its response; a repeated key gets
+    the stored response for IDEMPOTENCY_TTL_SECONDS.
+    """
     if not front.filename or not back.filename:
         raise HTTPException(status_code=400, detail="Both front and back images are required.")
 
+    mode = _grading_mode(mode)
+
+    # Refuse early so a full queue doesn't cost us the upload
+    if async_job and jobs.queue.is_full():
+        raise HTTPException(status_code=429, detail="Grading queue is full, retry later.", headers={"Retry-After": "30"})
+
+    # Fingerprint the spooled uploads before anything is created for them
+    try:
+        front_digest = await storage.upload_digest(front)
+        back_digest = await storage.upload_digest(back)
+    except storage.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    fingerprint = {"front": front_digest, "back": back_digest, "mode": mode, "async_job": async_job}
+    try:
+        response, shared = await idempotency.coalescer.run(
+            lambda: _accept_grade(user_id, front, back, async_job, mode),
+            fingerprint,
+            idempotency_key=f"{user_id}\0{idempotency_key}" if idempotency_key else None,
+            content_key="\0".join([user_id, front_digest, back_digest, mode, "async" if async_job else "sync"]),
+        )
+    except idempotency.IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if shared:
+        metrics.GRADES_TOTAL.inc(outcome="shared")
+    return JSONResponse(
+        status_code=response["status_code"],
+        content=response["body"],
+        headers={"Idempotent-Replayed": "true"} if shared else None,
+    )
+
+
+async def _accept_grade(user_id: str, front: UploadFile, back: UploadFile, async_job: bool, mode: str) -> dict:
+    """Save, check and grade (or queue) one upload; returns {status_code, body}."""
+
     comic_id = str(uuid.uuid4())
 
     # 1) Create directory structure
     dirs = storage.create_comic_directories(user_id, comic_id)
 
     # 2) Save originals
-    original_paths = await storage.save_original_uploads(front, back, dirs["original"])
-
-    # 3) Hybrid AI + algorithm grading
     try:
-        grading_result = openai_hybrid_grading.grade_comic(
-            front_path=original_paths["front"],
-            back_path=original_paths["back"],
+        with metrics.timed("upload"):
+            original_paths, digests = await storage.save_original_uploads_with_digests(front, back, dirs["original"])
+    except storage.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # 3) Turn away unusable scans before any grading work. The gate reads a
+    # cheap sample decode either way; graded right away, it runs in the same
+    # CPU pool task per side as the stages the mode needs up front.
+    images = None if async_job else _image_handles(original_paths, digests)
+    if images is not None:
+        await cpu_pool.prepare_images(images.values(), _prepared_steps(mode))
+    issues = await _quality_issues(user_id, comic_id, images or original_paths)
+    if issues:
+        raise HTTPException(
+            status_code=422,
+            detail={"message": "Scan quality too low to grade; please rescan.", "issues": issues},
+        )
+
+    if async_job:
+        try:
+            jobs.queue.submit(
+                comic_id,
+                lambda: _run_grading(
+                    user_id, comic_id, dirs, original_paths, digests, mode, model_scheduler.PRIORITY_BATCH
+                ),
+                user_id=user_id,
+                mode=mode,
+            )
+        except jobs.QueueFull as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+
+        return {
+            "status_code": 202,
+            "body": {
+                "user_id": user_id,
+                "comic_id": comic_id,
+                "status": "queued",
+                "status_url": f"/api/comics/{comic_id}/status",
+                "result_url": f"/api/comics/{comic_id}/result",
+            },
+        }
+
+    body = await _run_grading(user_id, comic_id, dirs, original_paths, digests, mode, images=images)
+    return {"status_code": 200, "body": body}
+
+
+def _image_handles(original_paths: Dict[str, Path], digests: Dict[str, str]) -> Dict[str, preprocessing.ImageHandle]:
+    """One decode-once handle per side, shared by every grading stage (and the gate's verdict)."""
+    return {side: preprocessing.ImageHandle(path, digests.get(side)) for side, path in original_paths.items()}
+
+
+def _prepared_steps(mode: str) -> List[str]:
+    """
+    The gate plus whatever every grade in the mode needs, in one CPU pool
+    task per side. The model payload isn't among them: it is encoded only after
+    the result / opinion caches miss.
+    """
+    steps = ["quality"] if quality_gate.QUALITY_GATE_ENABLED else []
+    return steps + grading_engine.MODE_IMAGE_STEPS[mode]
+
+
+async def _quality_issues(user_id: str, comic_id: str, images: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Run the scan quality gate; a rejected comic's saved originals are removed."""
+    with metrics.timed("quality_gate"):
+        if not quality_gate.QUALITY_GATE_ENABLED or all(_has_verdict(image) for image in images.values()):
+            issues = quality_gate.check_scans(images)  # off, or already prepared
+        else:
+            # Not prepared, or preparing failed: never decode on the event loop
+            paths = {side: getattr(image, "path", image) for side, image in images.items()}
+            issues = await cpu_pool.run(quality_gate.check_scans, paths)
+    if issues:
+        metrics.GRADES_TOTAL.inc(outcome="rejected")
+        await asyncio.to_thread(storage.delete_comic, user_id, comic_id)
+    return issues
+
+
+def _has_verdict(image: Any) -> bool:
+    return isinstance(image, preprocessing.ImageHandle) and image.has("quality_issues")
+
+
+def _grading_mode(mode: Optional[str]) -> str:
+    mode = (mode or grading_engine.GRADING_MODE).lower()
+    if mode not in grading_engine.GRADING_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown grading mode '{mode}'. Use one of: {', '.join(grading_engine.GRADING_MODES)}",
         )
+    return mode
+
+
+async def _run_grading(
+    user_id: str,
+    comic_id: str,
+    dirs: Dict[str, Path],
+    original_paths: Dict[str, Path],
+    digests: Dict[str, str],
+    mode: str,
+    priority: int = model_scheduler.PRIORITY_INTERACTIVE,
+    images: Optional[Dict[str, preprocessing.ImageHandle]] = None,
+) -> dict:
+    """Grade -> save analysis for already-saved originals."""
+
+    # 4) Local / AI / hybrid / dual / tiered grading
+    grading_result = await _grade(original_paths, digests, mode, priority, images)
+    return await asyncio.to_thread(
+        _finish_grading, user_id, comic_id, dirs, grading_result, original_paths, digests
+    )
+
+
+async def _grade(
+    original_paths: Dict[str, Path],
+    digests: Dict[str, str],
+    mode: str,
+    priority: int = model_scheduler.PRIORITY_INTERACTIVE,
+    images: Optional[Dict[str, preprocessing.ImageHandle]] = None,
+) -> dict:
+    """
+    Grade saved originals; model calls queue behind higher-priority ones.
+    Each side is decoded at most once (`images`, or fresh handles).
+    """
+    images = images or _image_handles(original_paths, digests)
+    try:
+        with model_scheduler.priority(priority), metrics.GRADES_IN_FLIGHT.track(), metrics.timed("ai_grading"):
+            grading_result = await grading_engine.grade_comic(
+                front_path=images["front"],
+                back_path=images["back"],
+                mode=mode,
+                digests=digests,
+            )
+    except opinion_parsing.OpinionParseError as e:
+        # The model answered, but not with a usable opinion even after repair
+        metrics.GRADES_TOTAL.inc(outcome="error")
+        raise HTTPException(status_code=502, detail=f"AI grader returned an unusable opinion: {e}")
     except Exception as e:
+        metrics.GRADES_TOTAL.inc(outcome="error")
         raise HTTPException(status_code=500, detail=f"AI grading failed: {e}")
+    finally:
+        for image in images.values():
+            image.release()
+
+    metrics.GRADES_TOTAL.inc(outcome="ok")
+    return grading_result
+
+
+def _finish_grading(
+    user_id: str,
+    comic_id: str,
+    dirs: Dict[str, Path],
+    grading_result: dict,
+    original_paths: Optional[Dict[str, Path]] = None,
+    digests: Optional[Dict[str, str]] = None,
+) -> dict:
+    """Persist a grading result (+ its index row) and build the API response."""
 
     # grading_result shape:
     # {
@@ -41,16 +243,13 @@ async def grade_comic(
     #   "flags": {...}
     # }
 
-    # 4) Save analysis JSON
-    analysis_path = storage.save_analysis(grading_result, dirs["analysis"])
+    # 5) Save analysis JSON and index it
+    with metrics.timed("save_analysis"):
+        analysis_path = storage.save_analysis(grading_result, dirs["analysis"], digests, original_paths)
 
-    # 5) Generate PDF report
-    report_path = reports.generate_report(
-        user_id=user_id,
-        comic_id=comic_id,
-        grading_result=grading_result,
-        report_dir=dirs["reports"],
-    )
+    # 6) PDF report is rendered lazily on first download (or prerendered in the background)
+    if reports.REPORT_PRERENDER:
+        reports.submit_report(user_id, comic_id, grading_result, dirs["reports"])
 
     return {
         "user_id": user_id,
@@ -61,5 +260,259 @@ async def grade_comic(
         "confidence": grading_result["confidence"],
         "flags": grading_result.get("flags", {}),
         "analysis_path": str(analysis_path),
-        "report_path": str(report_path),
+        "report_url": f"/api/comics/{comic_id}/report?user_id={quote(user_id)}",
     }
+
+
+@router.post("/grade/batch")
+async def grade_batch(
+    user_id: str = Form(...),
+    fronts: Optional[List[UploadFile]] = File(None),
+    backs: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    mode: Optional[str] = Form(None),
+):
+    """
+    Grade a whole collection in one request.
+
+    Send either matching `fronts` / `backs` file lists (paired by order) or
+    a zip `archive` with `<name>_front.*` / `<name>_back.*` members.
+    Results stream back as NDJSON, one line per comic as it finishes.
+    `mode` applies to every comic in the batch.
+    """
+    mode = _grading_mode(mode)
+    fronts = fronts or []
+    backs = backs or []
+
+    if len(fronts) != len(backs):
+        raise HTTPException(status_code=400, detail="fronts and backs must have the same number of files.")
+    if not fronts and archive is None:
+        raise HTTPException(status_code=400, detail="Send fronts/backs files or a zip archive.")
+    if len(fronts) > batch.BATCH_MAX_COMICS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {batch.BATCH_MAX_COMICS} comics.")
+
+    # Save everything up front; upload files are closed once we return.
+    items = []
+    for front, back in zip(fronts, backs):
+        items.append(await _save_batch_item(user_id, len(items), front.filename or "comic", front=front, back=back))
+
+    if archive is not None:
+        archive_path = storage.TEMP_UPLOADS_ROOT / f"batch_{uuid.uuid4().hex}.zip"
+        try:
+            await storage.stream_upload(archive, archive_path, max_bytes=batch.MAX_BATCH_ARCHIVE_BYTES)
+            pairs, unpaired = await asyncio.to_thread(_archive_pairs, archive_path)
+            if len(items) + len(pairs) > batch.BATCH_MAX_COMICS:
+                raise HTTPException(status_code=413, detail=f"Batch exceeds {batch.BATCH_MAX_COMICS} comics.")
+
+            for name, front_member, back_member in pairs:
+                items.append(await _save_batch_item(user_id, len(items), name, archive_path, front_member, back_member))
+            for name in unpaired:
+                items.append({"index": len(items), "name": name, "error": "No matching front/back image."})
+        except storage.UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except zipfile.BadZipFile as e:
+            raise HTTPException(status_code=400, detail=f"Invalid zip archive: {e}")
+        finally:
+            archive_path.unlink(missing_ok=True)
+
+    return StreamingResponse(_stream_batch(user_id, items, mode), media_type="application/x-ndjson")
+
+
+def _archive_pairs(archive_path: Path):
+    with zipfile.ZipFile(archive_path) as zf:
+        return batch.pair_archive_members(zf.namelist())
+
+
+async def _save_batch_item(
+    user_id: str,
+    index: int,
+    name: str,
+    archive_path: Optional[Path] = None,
+    front_member: Optional[str] = None,
+    back_member: Optional[str] = None,
+    front: Optional[UploadFile] = None,
+    back: Optional[UploadFile] = None,
+) -> dict:
+    comic_id = str(uuid.uuid4())
+    dirs = storage.create_comic_directories(user_id, comic_id)
+
+    try:
+        if archive_path is not None:
+            original_paths, digests = await asyncio.to_thread(
+                batch.extract_pair, archive_path, front_member, back_member, dirs["original"]
+            )
+        else:
+            original_paths, digests = await storage.save_original_uploads_with_digests(front, back, dirs["original"])
+    except storage.UploadTooLarge as e:
+        return {"index": index, "name": name, "comic_id": comic_id, "error": str(e)}
+
+    return {
+        "index": index,
+        "name": name,
+        "comic_id": comic_id,
+        "dirs": dirs,
+        "original_paths": original_paths,
+        "digests": digests,
+    }
+
+
+async def _stream_batch(user_id: str, items: List[dict], mode: str):
+    """Grade saved batch items with bounded parallelism, yielding NDJSON lines."""
+
+    semaphore = asyncio.Semaphore(batch.BATCH_CONCURRENCY)
+
+    # Identical front/back pairs in one batch share a single grade
+    shared: Dict[tuple, asyncio.Future] = {}
+
+    async def grade_one(item: dict) -> dict:
+        line = {"index": item["index"], "name": item["name"], "comic_id": item.get("comic_id")}
+        if "error" in item:
+            return {**line, **{key: item[key] for key in ["error", "issues"] if key in item}}
+
+        async with semaphore:
+            try:
+                # The gate runs here, in parallel with the rest of the batch
+                # and in the same pool task as grading, not while unpacking
+                images = _image_handles(item["original_paths"], item["digests"])
+                await cpu_pool.prepare_images(images.values(), _prepared_steps(mode))
+                issues = await _quality_issues(user_id, item["comic_id"], images)
+                if issues:
+                    return {**line, "error": "Scan quality too low to grade; please rescan.", "issues": issues}
+
+                key = (item["digests"]["front"], item["digests"]["back"])
+                if key not in shared:
+                    shared[key] = asyncio.ensure_future(
+                        _grade(item["original_paths"], item["digests"], mode, model_scheduler.PRIORITY_BATCH, images)
+                    )
+                # Shielded: one waiter being cancelled mustn't cancel the
+                # grade for the others; the stream's `finally` cancels it
+                grading_result = await asyncio.shield(shared[key])
+
+                response = await asyncio.to_thread(
+                    _finish_grading,
+                    user_id,
+                    item["comic_id"],
+                    item["dirs"],
+                    grading_result,
+                    item["original_paths"],
+                    item["digests"],
+                )
+            except Exception as e:
+                return {**line, "error": getattr(e, "detail", None) or str(e)}
+
+        return {**line, **response}
+
+    tasks = [asyncio.ensure_future(grade_one(item)) for item in items]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done) + "\n"
+    finally:
+        # Client went away: stop grading the rest, shared grades included
+        for task in [*tasks, *shared.values()]:
+            task.cancel()
+
+
+@router.get("")
+async def list_comics(
+    user_id: str,
+    min_grade: Optional[float] = None,
+    max_grade: Optional[float] = None,
+    restoration_suspected: Optional[bool] = None,
+    sort: Optional[str] = None,
+    order: str = "desc",
+    limit: int = comic_index.COMIC_INDEX_PAGE_SIZE,
+    cursor: Optional[str] = None,
+):
+    """
+    A user's graded comics from the index: newest first, or by grade when
+    filtering on a grade range. `sort` = created / grade, `order` = asc /
+    desc; pass `next_cursor` back as `cursor` for the next page.
+    """
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'.")
+
+    try:
+        items, next_cursor = await asyncio.to_thread(
+            comic_index.list_comics,
+            user_id,
+            min_grade=min_grade,
+            max_grade=max_grade,
+            restoration_suspected=restoration_suspected,
+            sort=sort,
+            descending=order == "desc",
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"user_id": user_id, "items": items, "next_cursor": next_cursor}
+
+
+@router.get("/{comic_id}")
+async def get_comic(comic_id: str, user_id: str):
+    """One indexed comic: grade, hashes and artifact paths."""
+    comic = await asyncio.to_thread(comic_index.get_comic, user_id, comic_id)
+    if comic is None:
+        raise HTTPException(status_code=404, detail="Comic not found.")
+    return comic
+
+
+@router.delete("/{comic_id}")
+async def delete_comic(comic_id: str, user_id: str):
+    """Delete a comic; its original scans are freed once no other comic shares them."""
+    if any(Path(part).name != part or part == ".." for part in [user_id, comic_id]):
+        raise HTTPException(status_code=400, detail="Invalid user_id or comic_id.")
+
+    if not await asyncio.to_thread(storage.delete_comic, user_id, comic_id):
+        raise HTTPException(status_code=404, detail="Comic not found.")
+    return {"user_id": user_id, "comic_id": comic_id, "deleted": True}
+
+
+@router.get("/{comic_id}/status")
+async def grade_status(comic_id: str):
+    """Status of a queued grade (queued / running / done / failed)."""
+    job = jobs.queue.get(comic_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown grading job.")
+
+    job.pop("result", None)
+    job["result_url"] = f"/api/comics/{comic_id}/result"
+    return job
+
+
+@router.get("/{comic_id}/result")
+async def grade_result(comic_id: str):
+    """Result of a queued grade; 202 while it is still pending."""
+    job = jobs.queue.get(comic_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown grading job.")
+
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+
+    if job["status"] != "done":
+        return JSONResponse(
+            status_code=202,
+            content={"comic_id": comic_id, "status": job["status"], "status_url": f"/api/comics/{comic_id}/status"},
+        )
+
+    return job["result"]
+
+
+@router.get("/{comic_id}/report")
+async def grade_report(comic_id: str, user_id: str):
+    """Download the PDF report, rendering it on first request."""
+    if any(Path(part).name != part or part == ".." for part in [user_id, comic_id]):
+        raise HTTPException(status_code=400, detail="Invalid user_id or comic_id.")
+
+    dirs = storage.comic_directories(user_id, comic_id)
+    grading_result = await asyncio.to_thread(storage.load_analysis, dirs["analysis"])
+    if grading_result is None:
+        raise HTTPException(status_code=404, detail="No grading result for this comic.")
+
+    with metrics.timed("report"):
+        pdf_path = await asyncio.wrap_future(
+            reports.submit_report(user_id, comic_id, grading_result, dirs["reports"])
+        )
+    return FileResponse(pdf_path, media_type="application/pdf", filename=pdf_path.name)
@@ -1,5 +1,96 @@
+import hashlib
+import json
+from typing import Dict, Optional, Sequence, Tuple
+
 import numpy as np
 
+SUBGRADE_KEYS = ["corners", "spine", "surface", "centering", "color"]
+
+# Weight spine and corners a bit more, centering slightly less
+SUBGRADE_BOOSTS = {
+    "corners": 1.05,
+    "spine": 1.15,
+    "surface": 1.00,
+    "centering": 0.95,
+    "color": 1.00,
+}
+
+# Weighted final grade (similar to pro services)
+FINAL_WEIGHTS = {
+    "corners": 2,
+    "spine": 3,
+    "surface": 2,
+    "centering": 1,
+    "color": 2,
+}
+
+SCORE_MIN, SCORE_MAX = 0.5, 10.0
+CONFIDENCE_MIN, CONFIDENCE_MAX = 0.3, 0.98
+
+
+def tables_digest() -> str:
+    """Short hash of the scoring tables and bounds; changes whenever a rescore would."""
+    raw = json.dumps(
+        [SUBGRADE_BOOSTS, FINAL_WEIGHTS, SCORE_MIN, SCORE_MAX, CONFIDENCE_MIN, CONFIDENCE_MAX],
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def opinions_matrix(opinions: Sequence[dict]) -> np.ndarray:
+    """(N, 5) float matrix of subgrades in SUBGRADE_KEYS order; missing keys count as 0."""
+    return np.array(
+        [[float(opinion.get(key, 0)) for key in SUBGRADE_KEYS] for opinion in opinions],
+        dtype=np.float64,
+    ).reshape(len(opinions), len(SUBGRADE_KEYS))
+
+
+def _table(table: Dict[str, float]) -> np.ndarray:
+    return np.array([table[key] for key in SUBGRADE_KEYS], dtype=np.float64)
+
+
+def normalize_scores_batch(
+    raw_scores: np.ndarray,
+    boosts: Optional[Dict[str, float]] = None,
+    weights: Optional[Dict[str, float]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized `normalize_scores` for an (N, 5) matrix of raw subgrades
+    (columns in SUBGRADE_KEYS order).
+    Returns (normalized (N, 5) subgrades, (N,) finals).
+    """
+
+    scores = np.clip(np.asarray(raw_scores, dtype=np.float64), SCORE_MIN, SCORE_MAX)
+    scores = np.clip(scores * _table(boosts or SUBGRADE_BOOSTS), SCORE_MIN, SCORE_MAX)
+
+    finals = np.average(scores, axis=1, weights=_table(weights or FINAL_WEIGHTS))
+    return scores, np.round(finals, 1)
+
+
+def _round_exact(values: np.ndarray, decimals: int) -> np.ndarray:
+    """
+    Same as Python's round() per element. np.round scales by 10**decimals
+    first, which can tip values sitting right on a half; redo those in Python.
+    """
+
+    rounded = np.round(values, decimals)
+    scaled = values * 10.0**decimals
+    near_half = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half):
+        rounded[i] = round(float(values[i]), decimals)
+    return rounded
+
+
+def compute_confidence_batch(opinions_a: np.ndarray, opinions_b: np.ndarray) -> np.ndarray:
+    """Vectorized `compute_confidence` for two (N, 5) opinion matrices."""
+
+    diffs = np.abs(np.asarray(opinions_a, dtype=np.float64) - np.asarray(opinions_b, dtype=np.float64))
+    avg_diff = diffs.mean(axis=1)
+
+    # 0 diff -> 0.98, 2.0 diff -> ~0.5, >3 diff -> low
+    confidence = np.clip(1.0 - (avg_diff / 3.0), CONFIDENCE_MIN, CONFIDENCE_MAX)
+    return _round_exact(confidence, 2)
+
 
 def normalize_scores(raw_scores: dict) -> dict:
     """
@@ -7,37 +98,13 @@ def normalize_scores(raw_scores: dict) -> dict:
     Returns dict with normalized subgrades + 'final'.
     """
 
-    scores = raw_scores.copy()
-
-    # 1. Clamp everything to [0.5, 10.0]
-    for key in scores:
-        scores[key] = float(np.clip(scores[key], 0.5, 10.0))
-
-    # 2. Weight spine and corners a bit more, centering slightly less
-    weights_boost = {
-        "corners": 1.05,
-        "spine": 1.15,
-        "surface": 1.00,
-        "centering": 0.95,
-        "color": 1.00,
-    }
-
-    for key, factor in weights_boost.items():
-        scores[key] = float(np.clip(scores[key] * factor, 0.5, 10.0))
-
-    # 3. Weighted final grade (similar to pro services)
-    final = np.average(
-        [
-            scores["corners"],
-            scores["spine"],
-            scores["surface"],
-            scores["centering"],
-            scores["color"],
-        ],
-        weights=[2, 3, 2, 1, 2],
-    )
+    normalized, finals = normalize_scores_batch(opinions_matrix([raw_scores]))
 
-    scores["final"] = float(round(final, 1))
+    # Keys outside the subgrade table are only clamped
+    scores = {key: float(np.clip(value, SCORE_MIN, SCORE_MAX)) for key, value in raw_scores.items()}
+    scores.update(zip(SUBGRADE_KEYS, normalized[0].tolist()))
+
+    scores["final"] = float(finals[0])
     return scores
 
 
@@ -47,15 +114,4 @@ def compute_confidence(opinion_a: dict, opinion_b: dict) -> float:
     Lower disagreement = higher confidence.
     """
 
-    keys = ["corners", "spine", "surface", "centering", "color"]
-    diffs = []
-    for k in keys:
-        a = float(opinion_a.get(k, 0))
-        b = float(opinion_b.get(k, 0))
-        diffs.append(abs(a - b))
-
-    avg_diff = np.mean(diffs) if diffs else 0.0
-
-    # 0 diff -> 0.98, 2.0 diff -> ~0.5, >3 diff -> low
-    confidence = float(np.clip(1.0 - (avg_diff / 3.0), 0.3, 0.98))
-    return round(confidence, 2)
+    return float(compute_confidence_batch(opinions_matrix([opinion_a]), opinions_matrix([opinion_b]))[0])
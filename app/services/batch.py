@@ -0,0 +1,67 @@
+import os
+import re
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, List, Tuple
+
+from app.services import storage
+
+# Max front/back pairs accepted in one batch request
+BATCH_MAX_COMICS = int(os.getenv("BATCH_MAX_COMICS", "500"))
+
+# Comics graded at the same time within one batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+MAX_BATCH_ARCHIVE_BYTES = int(os.getenv("MAX_BATCH_ARCHIVE_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".heic", ".heif", ".tif", ".tiff"}
+
+# "<key><sep>front" / "<key><sep>back", e.g. "asm-300_front.jpg" or "asm-300/back.png"
+_SIDE_RE = re.compile(r"^(?P<key>.*?)[\s._/-]*(?P<side>front|back)$", re.IGNORECASE)
+
+
+def pair_archive_members(names: Iterable[str]) -> Tuple[List[Tuple[str, str, str]], List[str]]:
+    """
+    Pair zip member names into (key, front_member, back_member).
+    Returns (pairs, unpaired image members).
+    """
+
+    sides: Dict[str, Dict[str, str]] = {}
+    unpaired = []
+
+    for name in names:
+        path = PurePosixPath(name)
+        if name.endswith("/") or "__MACOSX" in path.parts or path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+
+        match = _SIDE_RE.match(str(path.with_suffix("")))
+        if not match:
+            unpaired.append(name)
+            continue
+        sides.setdefault(match["key"], {})[match["side"].lower()] = name
+
+    pairs = []
+    for key, found in sorted(sides.items()):
+        if "front" in found and "back" in found:
+            pairs.append((key or "comic", found["front"], found["back"]))
+        else:
+            unpaired.extend(found.values())
+
+    return pairs, unpaired
+
+
+def extract_pair(
+    archive_path: Path, front_member: str, back_member: str, original_dir: Path
+) -> Tuple[Dict[str, Path], Dict[str, str]]:
+    """Stream one front/back pair out of the archive into original/ (deduped by content)."""
+
+    paths = {}
+    digests = {}
+    with zipfile.ZipFile(archive_path) as zf:
+        for side, member in [("front", front_member), ("back", back_member)]:
+            dest = original_dir / f"{side}_{PurePosixPath(member).name}"
+            with zf.open(member) as src:
+                paths[side], digests[side] = storage.copy_stream(src, dest, name=member, dedupe=True)
+
+    storage.add_original_refs(original_dir, digests)
+    return paths, digests
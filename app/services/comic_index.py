@@ -0,0 +1,343 @@
+"""
+SQLite index of graded comics, so listing / looking up a user's collection
+never walks the storage tree.
+
+    python -m app.services.comic_index --rebuild   # (re)index an existing tree
+    python -m app.services.comic_index --gc-blobs  # drop unreferenced original blobs
+"""
+
+import os
+import argparse
+import base64
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.services import storage
+
+COMIC_INDEX_PATH = Path(os.getenv("COMIC_INDEX_PATH", str(storage.STORAGE_ROOT / "index.sqlite3")))
+
+# Page size bounds for list queries
+COMIC_INDEX_PAGE_SIZE = 50
+COMIC_INDEX_MAX_PAGE_SIZE = 500
+
+SORTS = ("created", "grade")
+
+_SUBGRADE_COLUMNS = ["corners", "spine", "surface", "centering", "color"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS comics (
+    user_id TEXT NOT NULL,
+    comic_id TEXT NOT NULL,
+    final REAL,
+    corners REAL,
+    spine REAL,
+    surface REAL,
+    centering REAL,
+    color REAL,
+    confidence REAL,
+    restoration_suspected INTEGER NOT NULL DEFAULT 0,
+    flags TEXT,
+    front_sha256 TEXT,
+    back_sha256 TEXT,
+    original_front TEXT,
+    original_back TEXT,
+    analysis_path TEXT,
+    report_path TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, comic_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS comics_by_created ON comics (user_id, created_at, comic_id);
+CREATE INDEX IF NOT EXISTS comics_by_grade ON comics (user_id, final, comic_id);
+CREATE TABLE IF NOT EXISTS blob_refs (
+    user_id TEXT NOT NULL,
+    comic_id TEXT NOT NULL,
+    side TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (user_id, comic_id, side)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS blob_refs_by_digest ON blob_refs (digest);
+"""
+
+_UPSERT = """
+INSERT INTO comics (
+    user_id, comic_id, final, corners, spine, surface, centering, color, confidence,
+    restoration_suspected, flags, front_sha256, back_sha256, original_front, original_back,
+    analysis_path, report_path, created_at, updated_at
+) VALUES (
+    :user_id, :comic_id, :final, :corners, :spine, :surface, :centering, :color, :confidence,
+    :restoration_suspected, :flags, :front_sha256, :back_sha256, :original_front, :original_back,
+    :analysis_path, :report_path, :created_at, :now
+)
+ON CONFLICT (user_id, comic_id) DO UPDATE SET
+    final = excluded.final,
+    corners = excluded.corners,
+    spine = excluded.spine,
+    surface = excluded.surface,
+    centering = excluded.centering,
+    color = excluded.color,
+    confidence = excluded.confidence,
+    restoration_suspected = excluded.restoration_suspected,
+    flags = excluded.flags,
+    front_sha256 = COALESCE(excluded.front_sha256, comics.front_sha256),
+    back_sha256 = COALESCE(excluded.back_sha256, comics.back_sha256),
+    original_front = COALESCE(excluded.original_front, comics.original_front),
+    original_back = COALESCE(excluded.original_back, comics.original_back),
+    analysis_path = excluded.analysis_path,
+    report_path = excluded.report_path,
+    updated_at = excluded.updated_at
+"""
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread; WAL lets readers run alongside the writer."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != COMIC_INDEX_PATH:
+        COMIC_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(COMIC_INDEX_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _local.conn, _local.path = conn, COMIC_INDEX_PATH
+    return conn
+
+
+@contextmanager
+def transaction():
+    """BEGIN IMMEDIATE ... COMMIT, rolled back if the block raises."""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def upsert(
+    conn: sqlite3.Connection,
+    user_id: str,
+    comic_id: str,
+    grading_result: dict,
+    digests: Optional[Dict[str, str]] = None,
+    original_paths: Optional[Dict[str, Path]] = None,
+    created_at: Optional[float] = None,
+) -> None:
+    """Insert or refresh one comic's row. Hashes/originals are kept when not given."""
+
+    dirs = storage.comic_directories(user_id, comic_id)
+    subgrades = grading_result.get("subgrades") or {}
+    flags = grading_result.get("flags") or {}
+    digests = digests or {}
+    original_paths = original_paths or {}
+
+    conn.execute(
+        _UPSERT,
+        {
+            "user_id": user_id,
+            "comic_id": comic_id,
+            "final": grading_result.get("final"),
+            **{key: subgrades.get(key) for key in _SUBGRADE_COLUMNS},
+            "confidence": grading_result.get("confidence"),
+            "restoration_suspected": int(bool(flags.get("restoration_suspected"))),
+            "flags": json.dumps(flags),
+            "front_sha256": digests.get("front"),
+            "back_sha256": digests.get("back"),
+            "original_front": str(original_paths["front"]) if "front" in original_paths else None,
+            "original_back": str(original_paths["back"]) if "back" in original_paths else None,
+            "analysis_path": str(dirs["analysis"] / "grading_result.json"),
+            "report_path": str(dirs["reports"] / "grading_report.pdf"),
+            "created_at": created_at or time.time(),
+            "now": time.time(),
+        },
+    )
+
+
+def _row_to_dict(row: sqlite3.Row) -> dict:
+    item = dict(row)
+    item["subgrades"] = {key: item.pop(key) for key in _SUBGRADE_COLUMNS}
+    item["subgrades"]["final"] = item["final"]
+    item["flags"] = json.loads(item["flags"]) if item["flags"] else {}
+    item["restoration_suspected"] = bool(item["restoration_suspected"])
+    return item
+
+
+def get_comic(user_id: str, comic_id: str) -> Optional[dict]:
+    row = _connect().execute(
+        "SELECT * FROM comics WHERE user_id = ? AND comic_id = ?", (user_id, comic_id)
+    ).fetchone()
+    return _row_to_dict(row) if row is not None else None
+
+
+def _encode_cursor(value, comic_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, comic_id]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        value, comic_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(value), str(comic_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def list_comics(
+    user_id: str,
+    min_grade: Optional[float] = None,
+    max_grade: Optional[float] = None,
+    restoration_suspected: Optional[bool] = None,
+    sort: Optional[str] = None,
+    descending: bool = True,
+    limit: int = COMIC_INDEX_PAGE_SIZE,
+    cursor: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of a user's comics plus the cursor for the next page (None at
+    the end). Keyset pagination on (sort column, comic_id) keeps every page
+    an index range scan, however deep.
+    `sort` defaults to "grade" for grade-range queries, else "created".
+    """
+
+    if sort is None:
+        sort = "grade" if min_grade is not None or max_grade is not None else "created"
+    if sort not in SORTS:
+        raise ValueError(f"Unknown sort '{sort}'. Use one of: {', '.join(SORTS)}")
+    column = "created_at" if sort == "created" else "final"
+    limit = max(1, min(limit, COMIC_INDEX_MAX_PAGE_SIZE))
+
+    after = _decode_cursor(cursor) if cursor is not None else None
+
+    # With a grade-sorted cursor inside the range, the cursor replaces the
+    # bound on its side; SQLite only uses one bound per side of the index.
+    if after is not None and sort == "grade":
+        if descending and max_grade is not None and after[0] <= max_grade:
+            max_grade = None
+        if not descending and min_grade is not None and after[0] >= min_grade:
+            min_grade = None
+
+    where = ["user_id = ?"]
+    params: list = [user_id]
+    if min_grade is not None:
+        where.append("final >= ?")
+        params.append(min_grade)
+    if max_grade is not None:
+        where.append("final <= ?")
+        params.append(max_grade)
+    if restoration_suspected is not None:
+        where.append("restoration_suspected = ?")
+        params.append(int(restoration_suspected))
+    if after is not None:
+        where.append(f"({column}, comic_id) {'<' if descending else '>'} (?, ?)")
+        params.extend(after)
+
+    direction = "DESC" if descending else "ASC"
+    rows = _connect().execute(
+        f"SELECT * FROM comics WHERE {' AND '.join(where)} "
+        f"ORDER BY {column} {direction}, comic_id {direction} LIMIT ?",
+        params + [limit + 1],
+    ).fetchall()
+
+    items = [_row_to_dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = _encode_cursor(last[column], last["comic_id"])
+    return items, next_cursor
+
+
+def count_comics(user_id: str) -> int:
+    return _connect().execute("SELECT COUNT(*) FROM comics WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+
+def add_blob_refs(user_id: str, comic_id: str, digests: Dict[str, str]) -> None:
+    """Record which content blobs (by side) a comic's originals point at."""
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO blob_refs (user_id, comic_id, side, digest) VALUES (?, ?, ?, ?)",
+            [(user_id, comic_id, side, digest) for side, digest in digests.items()],
+        )
+
+
+def blob_refcount(digest: str) -> int:
+    return _connect().execute("SELECT COUNT(*) FROM blob_refs WHERE digest = ?", (digest,)).fetchone()[0]
+
+
+def delete_comic(user_id: str, comic_id: str) -> Optional[List[str]]:
+    """
+    Drop a comic's row and blob references.
+    Returns the digests it referenced, or None if the index didn't know it.
+    """
+
+    with transaction() as conn:
+        digests = [
+            row[0]
+            for row in conn.execute(
+                "SELECT digest FROM blob_refs WHERE user_id = ? AND comic_id = ?", (user_id, comic_id)
+            )
+        ]
+        conn.execute("DELETE FROM blob_refs WHERE user_id = ? AND comic_id = ?", (user_id, comic_id))
+        deleted = conn.execute(
+            "DELETE FROM comics WHERE user_id = ? AND comic_id = ?", (user_id, comic_id)
+        ).rowcount
+
+    if not deleted and not digests:
+        return None
+    return digests
+
+
+def rebuild(batch_size: int = 1000) -> int:
+    """Index every saved grading_result under USERS_ROOT; returns rows written."""
+
+    written = 0
+    pending = []
+
+    def flush():
+        with transaction() as conn:
+            for user_id, comic_id, result, created_at in pending:
+                upsert(conn, user_id, comic_id, result, created_at=created_at)
+        pending.clear()
+
+    for user_id, comic_id in storage.iter_comics():
+        analysis_dir = storage.comic_directories(user_id, comic_id)["analysis"]
+        try:
+            result = storage.load_analysis(analysis_dir)
+            created_at = (analysis_dir / "grading_result.json").stat().st_mtime
+        except (ValueError, FileNotFoundError):
+            continue
+        if result is None:
+            continue
+        pending.append((user_id, comic_id, result, created_at))
+        written += 1
+        if len(pending) >= batch_size:
+            flush()
+
+    if pending:
+        flush()
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain the graded-comics index.")
+    parser.add_argument("--rebuild", action="store_true", help="Index every saved result in the storage tree.")
+    parser.add_argument("--gc-blobs", action="store_true", help="Delete original blobs no comic references.")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(json.dumps({"indexed": rebuild(), "index": str(COMIC_INDEX_PATH)}))
+    if args.gc_blobs:
+        print(json.dumps({"blobs_removed": storage.gc_blobs()}))
+    if not args.rebuild and not args.gc_blobs:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Shared process pool for the CPU-bound stages: image decode, the quality
+gate, local scoring statistics, model payload encoding and PDF rendering.
+
+Threads can't run these in parallel (Pillow / NumPy / ReportLab hold the
+GIL for much of the work), so one busy grade stalls the rest of the worker.
+The pool is started by the app lifespan with warm workers (heavy imports
+already paid) and shut down with it. Until it starts, or with
+CPU_POOL_WORKERS=0, the same work runs on threads in this process.
+
+Images go through `prepare_images`: each side is decoded once in a worker,
+which returns only the small derived values (gate verdict, scoring stats,
+the model data URL) to prime the caller's ImageHandle with; pixels never
+cross the process boundary.
+"""
+
+import os
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from app.services import grading, metrics, preprocessing, quality_gate
+
+# Worker processes (0 = run everything on threads in this process)
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(os.cpu_count() or 1)))
+
+# What `prepare_images` can compute per image: step -> (memo key on the handle, function)
+IMAGE_STEPS: Dict[str, Tuple[str, Callable]] = {
+    "quality": ("quality_issues", quality_gate.check_scan),
+    "stats": ("stats", grading.image_stats),
+    "payload": ("data_url", preprocessing.data_url),
+}
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_workers = 0
+_thread_workers = max(1, CPU_POOL_WORKERS or 4)
+_threads = ThreadPoolExecutor(max_workers=_thread_workers, thread_name_prefix="cpu")
+_pending = 0
+_lock = threading.Lock()
+
+
+def _warm() -> None:
+    """Worker initializer: pay the heavy imports once, not on the first grade."""
+    import numpy  # noqa: F401
+    import PIL.Image  # noqa: F401
+    import reportlab.pdfgen.canvas  # noqa: F401
+
+    from app.services import reports  # noqa: F401
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _create(workers: int) -> ProcessPoolExecutor:
+    # spawn, not fork: the parent has an event loop and client threads running
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_warm,
+    )
+
+
+def start(workers: int = CPU_POOL_WORKERS) -> None:
+    """Start the pool and wait until every worker is up (blocking)."""
+    global _pool, _workers
+    if _pool is not None or workers <= 0:
+        return
+    _pool, _workers = _create(workers), workers
+    # One ping per worker makes the pool spawn all of them now
+    for future in [_pool.submit(_ping) for _ in range(workers)]:
+        future.result()
+
+
+def shutdown() -> None:
+    """Stop the pool; queued tasks are cancelled, running ones finish."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def running() -> bool:
+    return _pool is not None
+
+
+def depth() -> Dict[str, int]:
+    """Tasks submitted and not finished, split into running / queued."""
+    with _lock:
+        pending = _pending
+    slots = _workers if _pool is not None else _thread_workers
+    return {"running": min(pending, slots), "queued": max(0, pending - slots)}
+
+
+def _finished(_future: Future) -> None:
+    global _pending
+    with _lock:
+        _pending -= 1
+
+
+def submit(fn: Callable, *args, fallback: Optional[Executor] = None) -> Future:
+    """
+    Run `fn(*args)` on the process pool, or on `fallback` (default: this
+    module's threads) when the pool isn't running. `fn` and `args` must be
+    picklable.
+    """
+    global _pool
+    executor = _pool or fallback or _threads
+    try:
+        return _track(executor.submit(fn, *args))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed over memory); replace the pool
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = _create(_workers)
+        return _track(_pool.submit(fn, *args))
+
+
+def _track(future: Future) -> Future:
+    global _pending
+    with _lock:
+        _pending += 1
+    future.add_done_callback(_finished)
+    return future
+
+
+async def run(fn: Callable, *args):
+    """`submit` for async callers."""
+    return await asyncio.wrap_future(submit(fn, *args))
+
+
+def _run_steps(handle: preprocessing.ImageHandle, steps: Tuple[str, ...]) -> None:
+    for step in steps:
+        try:
+            IMAGE_STEPS[step][1](handle)
+        except Exception:
+            # Leave it unmemoized: the caller recomputes off the event loop
+            # and raises in context
+            logger.exception("cpu_pool: %r step failed for %s", step, handle.path)
+            break
+
+
+def _prepare_image(path: Path, digest: Optional[str], preset: str, steps: Tuple[str, ...]):
+    """Worker side: decode once, compute `steps`, return (size, derived values)."""
+    handle = preprocessing.ImageHandle(path, digest, preset)
+    _run_steps(handle, steps)
+    handle.release()
+    return handle.size, handle.derived()
+
+
+def _prepare_local(handle: preprocessing.ImageHandle, steps: Tuple[str, ...]):
+    """Thread fallback: compute `steps` on the caller's handle itself."""
+    _run_steps(handle, steps)
+    return handle.size, {}
+
+
+async def prepare_images(images: Iterable[preprocessing.ImageHandle], steps: Iterable[str]) -> None:
+    """
+    Compute `steps` ("quality", "stats", "payload") for each image in
+    parallel and memoize the results on the handles, so the usual calls
+    (`quality_gate.check_scan`, `grading.image_stats`,
+    `preprocessing.data_url`) return without decoding.
+    Steps already memoized on a handle are skipped.
+    """
+
+    tasks = []
+    for handle in images:
+        missing = tuple(step for step in steps if not handle.has(IMAGE_STEPS[step][0]))
+        if not missing:
+            continue
+        if _pool is not None:
+            future = submit(_prepare_image, handle.path, handle.digest, handle.preset, missing)
+        else:
+            future = _track(_threads.submit(_prepare_local, handle, missing))
+        tasks.append((handle, future))
+
+    if not tasks:
+        return
+    with metrics.timed("image_prep"):
+        for handle, future in tasks:
+            size, derived = await asyncio.wrap_future(future)
+            handle.prime(size, derived)
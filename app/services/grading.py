@@ -0,0 +1,114 @@
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+
+from app.services import preprocessing
+
+ImageSource = Union[Path, preprocessing.ImageHandle]
+
+
+def _stack_stats(stack: np.ndarray) -> np.ndarray:
+    """[edge strength, brightness] sums for an (N, H, W) uint8 stack.
+
+    Edges use the same 3x3 kernel as PIL's FIND_EDGES (8 * center minus the
+    8 neighbours, clipped to 0–255, border pixels passed through), computed
+    in int16 so there are no full-size float temporaries.
+    """
+    n, h, w = stack.shape
+    x = stack.astype(np.int16)
+
+    acc = x[:, 1:-1, 1:-1] * 9
+    for dy in range(3):
+        for dx in range(3):
+            acc -= x[:, dy:dy + h - 2, dx:dx + w - 2]
+    np.clip(acc, 0, 255, out=acc)
+
+    edge_sum = acc.sum(axis=(1, 2), dtype=np.int64)
+    edge_sum += stack[:, 0, :].sum(axis=1, dtype=np.int64) + stack[:, -1, :].sum(axis=1, dtype=np.int64)
+    edge_sum += stack[:, 1:-1, 0].sum(axis=1, dtype=np.int64) + stack[:, 1:-1, -1].sum(axis=1, dtype=np.int64)
+
+    brightness_sum = stack.sum(axis=(1, 2), dtype=np.int64)
+
+    return np.stack([edge_sum, brightness_sum], axis=1) / float(h * w)
+
+
+def _scores_from_stats(stats: np.ndarray) -> np.ndarray:
+    """Map a stack of image stats to 0.0–10.0 scores in one vectorized pass."""
+    edge_strength = stats[:, 0] / 255.0  # 0–1
+
+    # Brightness score: avoid too dark / too blown out
+    mean_brightness = stats[:, 1] / 255.0  # 0–1
+    brightness_score = 1.0 - np.abs(mean_brightness - 0.5) * 2  # peak at 0.5
+
+    raw_score = 0.6 * edge_strength + 0.4 * brightness_score
+    return np.round(np.clip(raw_score * 10.0, 0.0, 10.0), 1)
+
+
+def image_stats(image: ImageSource) -> np.ndarray:
+    """[mean edge strength, mean brightness] of one image, memoized on a handle.
+
+    A handle's existing decode is reused (grayscale at ~DECODE_MAX_DIM,
+    JPEGs DCT-decoded at reduced size).
+    """
+    return preprocessing.image_handle(image).derive("stats", lambda handle: _stack_stats(handle.gray()[None])[0])
+
+
+def _score_images(images: List[ImageSource]) -> List[float]:
+    """Score several images (e.g. front + back) as one batch; takes paths or ImageHandles."""
+    stats = np.stack([image_stats(image) for image in images])
+    return list(_scores_from_stats(stats))
+
+
+def _image_score(path: ImageSource) -> float:
+    """Very simple heuristic scoring function.
+
+    This is a placeholder so the pipeline runs end-to-end.
+    You can replace this with a proper ML model later.
+
+    It looks at:
+    - edge strength (sharper = better)
+    - brightness distribution
+    and maps that to a 0.0–10.0 scale.
+    """
+    return _score_images([path])[0]
+
+
+def grade_comic(processed_paths: Dict[str, ImageSource]) -> Dict[str, float]:
+    """Compute subgrades and a final grade from processed images.
+
+    For now, we derive subgrades from simple stats of the front/back images.
+    This is intentionally transparent and easy to swap out later.
+    """
+    front_score, back_score = _score_images([processed_paths["front"], processed_paths["back"]])
+
+    # Derive fake-but-consistent subgrades from the two views
+    corners = round((front_score * 0.6 + back_score * 0.4), 1)
+    spine = round((front_score * 0.7 + back_score * 0.3), 1)
+    surface = round((front_score * 0.5 + back_score * 0.5), 1)
+    centering = round(min(10.0, front_score + 0.3), 1)
+    color = round(min(10.0, (front_score * 0.8 + back_score * 0.2)), 1)
+
+    subgrades = {
+        "corners": corners,
+        "spine": spine,
+        "surface": surface,
+        "centering": centering,
+        "color": color,
+    }
+
+    # Simple weighted average for final grade
+    weights = {
+        "corners": 0.2,
+        "spine": 0.25,
+        "surface": 0.25,
+        "centering": 0.15,
+        "color": 0.15,
+    }
+
+    final_grade = 0.0
+    for key, weight in weights.items():
+        final_grade += subgrades[key] * weight
+
+    subgrades["final"] = round(final_grade, 1)
+    return subgrades
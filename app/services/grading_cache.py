@@ -0,0 +1,175 @@
+import os
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.services.storage import STORAGE_ROOT
+
+GRADING_CACHE_ENABLED = os.getenv("GRADING_CACHE_ENABLED", "1") == "1"
+GRADING_CACHE_ROOT = STORAGE_ROOT / "cache" / "grading"
+
+# In-memory LRU tier
+GRADING_CACHE_MEMORY_ENTRIES = int(os.getenv("GRADING_CACHE_MEMORY_ENTRIES", "1024"))
+
+# On-disk tier (one small JSON file per entry)
+GRADING_CACHE_DISK_ENTRIES = int(os.getenv("GRADING_CACHE_DISK_ENTRIES", "100000"))
+
+# Entries older than this are treated as misses and evicted from both tiers.
+GRADING_CACHE_TTL_SECONDS = float(os.getenv("GRADING_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# How many disk writes between size-eviction sweeps.
+_PRUNE_EVERY = 256
+
+
+def file_digest(path: Path) -> str:
+    """sha256 of a file on disk, read in chunks."""
+    with open(path, "rb") as fh:
+        return hashlib.file_digest(fh, "sha256").hexdigest()
+
+
+def make_key(kind: str, front_digest: str, back_digest: str, style: str, model: str) -> str:
+    """
+    Content-addressed cache key.
+    kind = 'opinion' (one AI pass) or 'result' (final grade_comic output).
+    """
+    raw = "\0".join([kind, front_digest, back_digest, style, model])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class GradingCache:
+    """Two-tier (memory LRU + disk) cache of grading opinions/results."""
+
+    def __init__(self, root: Path, memory_entries: int, disk_entries: int, ttl_seconds: float):
+        self.root = root
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _disk_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return copy.deepcopy(value)
+                del self._memory[key]
+                self.evictions += 1
+
+        path = self._disk_path(key)
+        try:
+            stored_at = path.stat().st_mtime
+            if now - stored_at > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                with self._lock:
+                    self.evictions += 1
+                    self.misses += 1
+                return None
+            value = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, stored_at, value)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._remember(key, time.time(), copy.deepcopy(value))
+            self._disk_writes += 1
+            prune = self._disk_writes % _PRUNE_EVERY == 0
+
+        # Write via temp file + rename so readers never see a partial entry.
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(value), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+        if prune:
+            self.prune_disk()
+
+    def _remember(self, key: str, stored_at: float, value: dict) -> None:
+        # Caller holds self._lock
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def prune_disk(self) -> int:
+        """Drop expired entries, then the oldest ones beyond the size limit."""
+        if not self.root.exists():
+            return 0
+
+        now = time.time()
+        removed = 0
+        live = []
+        for path in self.root.glob("*/*.json"):
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if now - mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                live.append((mtime, path))
+
+        overflow = len(live) - self.disk_entries
+        if overflow > 0:
+            live.sort()
+            for _, path in live[:overflow]:
+                path.unlink(missing_ok=True)
+                removed += 1
+
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        for path in self.root.glob("*/*.json"):
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+cache = GradingCache(
+    root=GRADING_CACHE_ROOT,
+    memory_entries=GRADING_CACHE_MEMORY_ENTRIES,
+    disk_entries=GRADING_CACHE_DISK_ENTRIES,
+    ttl_seconds=GRADING_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,149 @@
+import os
+import asyncio
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from app.services import cpu_pool, grading, metrics, openai_hybrid_grading, preprocessing
+from app.services.algorithms import compute_confidence
+
+GRADING_MODES = ("local", "ai", "hybrid", "dual", "tiered")
+GRADING_MODE = os.getenv("GRADING_MODE", "hybrid")
+
+# Tiered mode, local tier. Both are on the heuristic scorer's own 0–10 scale,
+# where real scans land around 1–5 (it rewards detail and even exposure, not
+# condition); recalibrate them whenever `grading` changes.
+# Local scores at/above this are the "high value" band and go to the model
+TIERED_LOCAL_HIGH_VALUE_MIN = float(os.getenv("TIERED_LOCAL_HIGH_VALUE_MIN", "3.0"))
+
+# Front and back local scores further apart than this = ambiguous scan
+TIERED_LOCAL_AMBIGUITY_SPREAD = float(os.getenv("TIERED_LOCAL_AMBIGUITY_SPREAD", "1.0"))
+
+# Tiered mode, AI tiers (grade scale): first-pass grades at/above this
+# always get a second pass
+TIERED_HIGH_VALUE_MIN = float(os.getenv("TIERED_HIGH_VALUE_MIN", "8.0"))
+
+# Tiered mode: skip the second AI pass when the first opinion's subgrades
+# agree with their own mean at least this well (per compute_confidence)
+TIERED_SECOND_PASS_BELOW = float(os.getenv("TIERED_SECOND_PASS_BELOW", "0.8"))
+
+# Confidence reported for grades that never reached the model
+LOCAL_ONLY_CONFIDENCE = 0.5
+
+# Confidence reported for a lone AI opinion with nothing to compare it to
+SINGLE_OPINION_CONFIDENCE = 0.6
+
+_SUBGRADE_KEYS = ["corners", "spine", "surface", "centering", "color"]
+
+# cpu_pool.prepare_images steps every grade in a mode needs up front (the
+# model payload is prepared only once a model call turns out to be needed)
+MODE_IMAGE_STEPS = {"local": ["stats"], "tiered": ["stats"], "ai": [], "hybrid": [], "dual": []}
+
+
+def _local_result(subgrades: Dict[str, float]) -> dict:
+    subgrades = {key: float(value) for key, value in subgrades.items()}
+    return {
+        "subgrades": subgrades,
+        "final": subgrades["final"],
+        "notes": "Graded from local image statistics only.",
+        "confidence": LOCAL_ONLY_CONFIDENCE,
+        "flags": {"restoration_suspected": False, "pressing_benefit": None, "page_color": None},
+    }
+
+
+def _single_opinion_result(opinion: dict, confidence: float) -> dict:
+    result = openai_hybrid_grading.combine_opinions(opinion, opinion)
+    result["confidence"] = confidence
+    result["opinions"] = {"strict": opinion}
+    return result
+
+
+def _needs_ai(front_score: float, back_score: float, local: Dict[str, float]) -> bool:
+    """Escalate a scan the heuristic puts in its high band, or whose sides disagree."""
+    return (
+        local["final"] >= TIERED_LOCAL_HIGH_VALUE_MIN
+        or abs(front_score - back_score) > TIERED_LOCAL_AMBIGUITY_SPREAD
+    )
+
+
+def _needs_second_pass(opinion: dict, first_pass: dict) -> bool:
+    """
+    A second AI pass for high-value grades, suspected restoration, or an
+    opinion compute_confidence isn't sure of: subgrades far from their own
+    mean (a lone pass has no other opinion to compare against).
+    """
+    mean = sum(float(opinion[key]) for key in _SUBGRADE_KEYS) / len(_SUBGRADE_KEYS)
+    consistency = compute_confidence(opinion, dict.fromkeys(_SUBGRADE_KEYS, mean))
+    return (
+        first_pass["final"] >= TIERED_HIGH_VALUE_MIN
+        or bool(opinion.get("restoration_suspected"))
+        or consistency < TIERED_SECOND_PASS_BELOW
+    )
+
+
+async def grade_comic(
+    front_path: Union[Path, preprocessing.ImageHandle],
+    back_path: Union[Path, preprocessing.ImageHandle],
+    mode: str = GRADING_MODE,
+    digests: Optional[Dict[str, str]] = None,
+) -> dict:
+    """
+    Grade a comic with the selected mode. Every mode returns the same shape
+    as `openai_hybrid_grading.grade_comic_async`.
+    `front_path` / `back_path` may be preprocessing.ImageHandles, so the
+    local scorer and the model payload share one decode per side.
+
+    - local:  heuristic image scorer only, no model calls
+    - ai:     one (strict) AI pass
+    - hybrid: strict + lenient AI passes, confidence from their disagreement
+    - dual:   like hybrid, but both opinions come from one AI call
+    - tiered: local first; one AI pass only for scans that are ambiguous or
+              in the heuristic's high band; a second pass only for high-value
+              or restored books, or a first opinion that isn't confident
+    """
+
+    if mode not in GRADING_MODES:
+        raise ValueError(f"Unknown grading mode '{mode}'. Use one of: {', '.join(GRADING_MODES)}")
+
+    # One decode per side, shared by the local scorer and the model payload
+    front_path = preprocessing.image_handle(front_path, (digests or {}).get("front"))
+    back_path = preprocessing.image_handle(back_path, (digests or {}).get("back"))
+
+    if mode in ("hybrid", "dual"):
+        return await openai_hybrid_grading.grade_comic_async(
+            front_path, back_path, digests=digests, single_call=mode == "dual"
+        )
+
+    if mode in ("local", "tiered"):
+        await cpu_pool.prepare_images([front_path, back_path], MODE_IMAGE_STEPS[mode])
+        with metrics.timed("local_grading"):
+            local = await asyncio.to_thread(grading.grade_comic, {"front": front_path, "back": back_path})
+
+        if mode == "local":
+            return _local_result(local)
+        # Stats are memoized on the handles, so this is just the arithmetic
+        front_score, back_score = grading._score_images([front_path, back_path])
+        if not _needs_ai(front_score, back_score, local):
+            metrics.TIERED_EXITS.inc(tier="local")
+            return _local_result(local)
+
+    cache_digests = await openai_hybrid_grading.resolve_digests(front_path, back_path, digests)
+    encoded: Dict[str, str] = {}
+
+    opinions = await openai_hybrid_grading.get_opinions_async(
+        front_path, back_path, ["strict"], cache_digests, encoded
+    )
+    strict = opinions["strict"]
+
+    if mode == "ai":
+        return _single_opinion_result(strict, SINGLE_OPINION_CONFIDENCE)
+
+    first_pass = _single_opinion_result(strict, SINGLE_OPINION_CONFIDENCE)
+    if not _needs_second_pass(strict, first_pass):
+        metrics.TIERED_EXITS.inc(tier="one_pass")
+        return first_pass
+
+    opinions = await openai_hybrid_grading.get_opinions_async(
+        front_path, back_path, ["lenient"], cache_digests, encoded
+    )
+    metrics.TIERED_EXITS.inc(tier="two_pass")
+    return openai_hybrid_grading.combine_opinions(strict, opinions["lenient"])
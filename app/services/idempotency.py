@@ -0,0 +1,129 @@
+import os
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+# Completed responses are replayed for a repeated Idempotency-Key this long
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+
+
+class IdempotencyConflict(Exception):
+    """An Idempotency-Key was reused for a different request."""
+
+
+class InMemoryIdempotencyBackend:
+    """
+    Default store for completed responses: a dict in this process.
+    Swap in another backend (Redis, a DB table, ...) with the same methods
+    to replay across workers.
+    """
+
+    def __init__(self):
+        self._records: Dict[str, dict] = {}
+
+    def save(self, key: str, record: dict) -> None:
+        self._records[key] = dict(record)
+
+    def load(self, key: str) -> Optional[dict]:
+        record = self._records.get(key)
+        return dict(record) if record is not None else None
+
+    def purge(self, stored_before: float) -> None:
+        expired = [key for key, record in self._records.items() if record["stored_at"] < stored_before]
+        for key in expired:
+            del self._records[key]
+
+
+class RequestCoalescer:
+    """
+    Collapses duplicate requests onto one unit of work:
+    - while a request is in flight, duplicates (same idempotency key or same
+      content key) wait for it and get its response
+    - after it succeeds, the response is kept under its idempotency key for
+      `ttl_seconds` and replayed to later retries
+    Failed requests are not remembered, so a retry runs again.
+    """
+
+    def __init__(self, backend, ttl_seconds: float):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._in_flight: Dict[str, Tuple[dict, asyncio.Future]] = {}
+
+    def in_flight(self) -> int:
+        return len({id(future) for _, future in self._in_flight.values()})
+
+    def _replay(self, key: str, fingerprint: dict) -> Optional[dict]:
+        self.backend.purge(time.time() - self.ttl_seconds)
+        record = self.backend.load(key)
+        if record is None:
+            return None
+        if record["fingerprint"] != fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used for a different request.")
+        return record["response"]
+
+    def _owner(self, keys, fingerprint: dict, idempotency_key: Optional[str]) -> Optional[asyncio.Future]:
+        for key in keys:
+            if key in self._in_flight:
+                owner_fingerprint, future = self._in_flight[key]
+                if key == idempotency_key and owner_fingerprint != fingerprint:
+                    raise IdempotencyConflict("Idempotency-Key is in use by a different request.")
+                return future
+        return None
+
+    async def run(
+        self,
+        work: Callable[[], Awaitable[dict]],
+        fingerprint: dict,
+        idempotency_key: Optional[str] = None,
+        content_key: Optional[str] = None,
+    ) -> Tuple[dict, bool]:
+        """
+        Return (response, shared): `work()`'s response, or the one from an
+        in-flight / completed duplicate (shared=True).
+        Raises IdempotencyConflict when the key was used with another fingerprint.
+        """
+
+        if idempotency_key is not None:
+            response = self._replay(idempotency_key, fingerprint)
+            if response is not None:
+                return response, True
+
+        keys = [key for key in (idempotency_key, content_key) if key is not None]
+        while True:
+            owner = self._owner(keys, fingerprint, idempotency_key)
+            if owner is None:
+                break
+            try:
+                return await asyncio.shield(owner), True
+            except asyncio.CancelledError:
+                if not owner.cancelled():
+                    raise
+                # The request we were waiting on was cancelled; take over
+
+        future = asyncio.get_running_loop().create_future()
+        for key in keys:
+            self._in_flight[key] = (fingerprint, future)
+        try:
+            response = await work()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        finally:
+            for key in keys:
+                if self._in_flight.get(key, (None, None))[1] is future:
+                    del self._in_flight[key]
+
+        future.set_result(response)
+        if idempotency_key is not None:
+            self.backend.save(
+                idempotency_key,
+                {"fingerprint": fingerprint, "response": response, "stored_at": time.time()},
+            )
+        return response, False
+
+
+coalescer = RequestCoalescer(backend=InMemoryIdempotencyBackend(), ttl_seconds=IDEMPOTENCY_TTL_SECONDS)
@@ -0,0 +1,141 @@
+import os
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Grades processed concurrently by the worker pool
+GRADING_JOB_WORKERS = int(os.getenv("GRADING_JOB_WORKERS", "4"))
+
+# Jobs allowed to wait for a worker before new submissions get a 429
+GRADING_JOB_QUEUE_SIZE = int(os.getenv("GRADING_JOB_QUEUE_SIZE", "100"))
+
+# Finished jobs are forgotten after this long
+GRADING_JOB_RETENTION_SECONDS = float(os.getenv("GRADING_JOB_RETENTION_SECONDS", "3600"))
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at capacity (backpressure)."""
+
+
+class InMemoryJobBackend:
+    """
+    Default job record store: a dict in this process.
+    Swap in another backend (Redis, a DB table, ...) with the same methods
+    to share job state across workers.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+
+    def save(self, job: dict) -> None:
+        self._jobs[job["job_id"]] = dict(job)
+
+    def load(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    def purge(self, finished_before: float) -> None:
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.get("finished_at") and job["finished_at"] < finished_before
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class JobQueue:
+    """
+    Bounded in-process job queue with a fixed pool of asyncio workers.
+    Workers start on the first submission and stop with `stop()`.
+    """
+
+    def __init__(self, backend, workers: int, max_queued: int, retention_seconds: float):
+        self.backend = backend
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _ensure_started(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def is_full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    def submit(self, job_id: str, runner: Callable[[], Awaitable[dict]], **meta) -> dict:
+        """
+        Enqueue `runner` (an async callable returning the job result).
+        Raises QueueFull when max_queued jobs are already waiting.
+        """
+
+        self._ensure_started()
+        self.backend.purge(time.time() - self.retention_seconds)
+
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "result": None,
+            **meta,
+        }
+
+        try:
+            self._queue.put_nowait((job_id, runner))
+        except asyncio.QueueFull:
+            raise QueueFull(f"Grading queue is full ({self.max_queued} jobs waiting)")
+
+        self.backend.save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.backend.load(job_id)
+
+    def _update(self, job_id: str, **changes) -> None:
+        job = self.backend.load(job_id)
+        if job is not None:
+            job.update(changes)
+            self.backend.save(job)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, runner = await self._queue.get()
+            self._update(job_id, status="running", started_at=time.time())
+            try:
+                result = await runner()
+            except asyncio.CancelledError:
+                self._update(job_id, status="failed", error="cancelled", finished_at=time.time())
+                raise
+            except Exception as e:
+                error = getattr(e, "detail", None) or str(e)
+                self._update(job_id, status="failed", error=error, finished_at=time.time())
+            else:
+                self._update(job_id, status="done", result=result, finished_at=time.time())
+            finally:
+                self._queue.task_done()
+
+
+queue = JobQueue(
+    backend=InMemoryJobBackend(),
+    workers=GRADING_JOB_WORKERS,
+    max_queued=GRADING_JOB_QUEUE_SIZE,
+    retention_seconds=GRADING_JOB_RETENTION_SECONDS,
+)
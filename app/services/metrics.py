@@ -0,0 +1,190 @@
+import os
+import bisect
+import contextlib
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Set METRICS_ENABLED=0 to turn every timer/counter into a no-op.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_registry: List["_Metric"] = []
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    @contextlib.contextmanager
+    def track(self, **labels):
+        """Count the enclosed block as in flight."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(row)) for key, row in self._values.items()]
+
+        lines = []
+        for key, row in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            cumulative += row[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {row[-1]}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+def timed(stage: str, histogram: Optional[Histogram] = None):
+    """`with timed("upload"): ...` records the block in the stage histogram."""
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _Timer(histogram or STAGE_SECONDS, {"stage": stage})
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "comicvault_stage_seconds",
+    "Time spent in each grading pipeline stage.",
+    ["stage"],
+)
+GRADES_TOTAL = Counter("comicvault_grades_total", "Grades by outcome.", ["outcome"])
+GRADES_IN_FLIGHT = Gauge("comicvault_grades_in_flight", "Grades currently being processed.")
+
+MODEL_CALLS_TOTAL = Counter("comicvault_model_calls_total", "AI grader calls by style and outcome.", ["style", "outcome"])
+MODEL_CALLS_IN_FLIGHT = Gauge("comicvault_model_calls_in_flight", "AI grader calls awaiting a response.")
+MODEL_PAYLOAD_BYTES = Counter("comicvault_model_payload_bytes_total", "Encoded image bytes sent to the model.")
+MODEL_TOKENS = Counter("comicvault_model_tokens_total", "Tokens reported by the model API.", ["kind"])
+MODEL_RETRIES_TOTAL = Counter("comicvault_model_retries_total", "AI grader calls retried, by error type.", ["reason"])
+MODEL_HEDGES_TOTAL = Counter("comicvault_model_hedges_total", "Hedged AI grader calls launched / won.", ["outcome"])
+MODEL_QUEUED = Gauge("comicvault_model_queued", "AI grader calls waiting for rate-limit budget.")
+
+TIERED_EXITS = Counter("comicvault_tiered_exits_total", "Tiered grades by the tier that settled them.", ["tier"])
+
+UPLOAD_BYTES = Counter("comicvault_upload_bytes_total", "Bytes of original scans received.")
+BLOB_DEDUP_TOTAL = Counter("comicvault_blob_dedup_total", "Uploaded originals that matched an already stored blob.")
+
+CACHE_STATS = Gauge("comicvault_grading_cache", "Grading cache entries, hits, misses and evictions.", ["stat"])
+JOB_QUEUE_DEPTH = Gauge("comicvault_job_queue_depth", "Queued grading jobs waiting for a worker.")
+CPU_POOL_TASKS = Gauge("comicvault_cpu_pool_tasks", "CPU pool tasks running / waiting for a worker.", ["state"])
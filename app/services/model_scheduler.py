@@ -0,0 +1,303 @@
+import os
+import asyncio
+import contextlib
+import contextvars
+import functools
+import heapq
+import itertools
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from app.services import metrics
+
+# Provider limits for this worker (0 = unlimited)
+MODEL_RPM_LIMIT = float(os.getenv("MODEL_RPM_LIMIT", "500"))
+MODEL_TPM_LIMIT = float(os.getenv("MODEL_TPM_LIMIT", "200000"))
+
+# Rough per-call token cost used to reserve TPM budget; corrected from `usage`
+MODEL_EST_TOKENS_PER_CALL = int(os.getenv("MODEL_EST_TOKENS_PER_CALL", "1500"))
+
+# Calls allowed in flight at once (matches the HTTP pool by default)
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", os.getenv("AI_MAX_CONNECTIONS", "50")))
+
+# Retries after the first attempt, with jittered exponential backoff
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "4"))
+MODEL_RETRY_BASE_DELAY = float(os.getenv("MODEL_RETRY_BASE_DELAY", "0.5"))
+MODEL_RETRY_MAX_DELAY = float(os.getenv("MODEL_RETRY_MAX_DELAY", "20"))
+
+# Hedging: when an attempt is slower than this latency quantile of recent
+# calls, fire a duplicate and keep whichever answers first.
+MODEL_HEDGE_ENABLED = os.getenv("MODEL_HEDGE_ENABLED", "0") == "1"
+MODEL_HEDGE_QUANTILE = float(os.getenv("MODEL_HEDGE_QUANTILE", "0.95"))
+MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", "20"))
+
+# At most this fraction of attempts may be hedged, so hedges can't double load
+MODEL_HEDGE_BUDGET = float(os.getenv("MODEL_HEDGE_BUDGET", "0.1"))
+
+# Lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("model_priority", default=PRIORITY_INTERACTIVE)
+
+
+@functools.lru_cache(maxsize=None)
+def _openai_errors():
+    """(rate limit error, retryable errors); the SDK is imported on first use, not at app import."""
+    import openai
+
+    retryable = (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+        asyncio.TimeoutError,
+    )
+    return openai.RateLimitError, retryable
+
+
+@contextlib.contextmanager
+def priority(level: int):
+    """Model calls made inside the block (and tasks it spawns) queue at `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 when it can be taken now)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount: float) -> None:
+        if self.rate > 0:
+            self._refill()
+            self.tokens -= amount
+
+    def drain(self) -> None:
+        """Provider said slow down: start refilling from empty."""
+        if self.rate > 0:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+
+class ModelScheduler:
+    """
+    Admission control for model calls on this worker:
+    - priority queue (interactive grades ahead of batch / queued jobs)
+    - requests/min and tokens/min token buckets
+    - a cap on calls in flight
+    `call()` adds retries with jittered backoff and optional hedging on top.
+    """
+
+    def __init__(self, rpm: float, tpm: float, max_concurrency: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiters = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._latencies = deque(maxlen=200)
+        self._attempts = 0
+        self._hedges = 0
+
+    def queued(self) -> int:
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    # --- admission ---------------------------------------------------------
+
+    async def acquire(self, level: int, est_tokens: int) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (tests, benchmarks): start clean
+            self._loop, self._waiters, self.in_flight, self._dispatcher = loop, [], 0, None
+            self._wakeup = asyncio.Event()
+
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (level, next(self._seq), est_tokens, future))
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self, est_tokens: int = 0, used_tokens: Optional[int] = None) -> None:
+        self.in_flight -= 1
+        if used_tokens is not None:
+            # Settle the reservation against what the call really cost
+            self.tokens.take(used_tokens - est_tokens)
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = self._loop.create_task(self._dispatch())
+        self._wakeup.set()
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            level, _, est_tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            wait = None  # at the concurrency cap: until a release
+            if self.in_flight < self.max_concurrency:
+                wait = max(self.requests.delay_for(1), self.tokens.delay_for(est_tokens))
+                if wait <= 0:
+                    heapq.heappop(self._waiters)
+                    self.requests.take(1)
+                    self.tokens.take(est_tokens)
+                    self.in_flight += 1
+                    future.set_result(None)
+                    continue
+
+            # Sleep until the budget refills, a slot frees, or a new waiter shows up
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- calls ------------------------------------------------------------
+
+    def _hedge_after(self) -> Optional[float]:
+        if not MODEL_HEDGE_ENABLED or len(self._latencies) < MODEL_HEDGE_MIN_SAMPLES:
+            return None
+        if self._hedges >= self._attempts * MODEL_HEDGE_BUDGET:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * MODEL_HEDGE_QUANTILE))]
+
+    async def _attempt(
+        self,
+        make_request: Callable[[], Awaitable],
+        level: int,
+        est_tokens: int,
+        timeout: float,
+        admitted: Optional[asyncio.Event] = None,
+    ):
+        with metrics.timed("model_queue"):
+            await self.acquire(level, est_tokens)
+        if admitted is not None:
+            admitted.set()
+
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(make_request(), timeout=timeout)
+        except BaseException as e:
+            if isinstance(e, _openai_errors()[0]):
+                self.requests.drain()
+            self.release()
+            raise
+
+        usage = getattr(response, "usage", None)
+        self.release(est_tokens, getattr(usage, "total_tokens", None))
+        self._latencies.append(time.monotonic() - start)
+        return response
+
+    async def _hedged_attempt(self, make_request, level: int, est_tokens: int, timeout: float):
+        self._attempts += 1
+        admitted = asyncio.Event()
+        primary = asyncio.ensure_future(self._attempt(make_request, level, est_tokens, timeout, admitted))
+        pending = {primary}
+        hedge = None
+        try:
+            hedge_after = self._hedge_after()
+            if hedge_after is not None:
+                # The latency quantile is measured from admission, so the
+                # timer starts there too, not while the primary is queued
+                waiter = asyncio.ensure_future(admitted.wait())
+                await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                done, _ = await asyncio.wait(pending, timeout=hedge_after)
+                # A hedge that would itself have to queue only adds load
+                if not done and not self.queued() and self.in_flight < self.max_concurrency:
+                    self._hedges += 1
+                    metrics.MODEL_HEDGES_TOTAL.inc(outcome="launched")
+                    hedge = asyncio.ensure_future(self._attempt(make_request, level, est_tokens, timeout))
+                    pending.add(hedge)
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            metrics.MODEL_HEDGES_TOTAL.inc(outcome="won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(
+        self,
+        make_request: Callable[[], Awaitable],
+        timeout: float,
+        est_tokens: int = MODEL_EST_TOKENS_PER_CALL,
+        max_retries: int = MODEL_MAX_RETRIES,
+    ):
+        """
+        Run `make_request()` (returns a fresh awaitable per attempt) under
+        the rate limits, retrying rate limits / timeouts / 5xx / connection
+        errors with jittered exponential backoff.
+        """
+
+        level = _priority.get()
+        for attempt in range(max_retries + 1):
+            try:
+                return await self._hedged_attempt(make_request, level, est_tokens, timeout)
+            except _openai_errors()[1] as e:
+                if attempt == max_retries:
+                    raise
+                metrics.MODEL_RETRIES_TOTAL.inc(reason=type(e).__name__)
+                await asyncio.sleep(_backoff(attempt, e))
+
+
+def _backoff(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, never shorter than a Retry-After."""
+    delay = random.uniform(0, min(MODEL_RETRY_MAX_DELAY, MODEL_RETRY_BASE_DELAY * 2**attempt))
+
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, min(MODEL_RETRY_MAX_DELAY, float(retry_after)))
+        except ValueError:
+            pass
+    return delay
+
+
+scheduler = ModelScheduler(
+    rpm=MODEL_RPM_LIMIT,
+    tpm=MODEL_TPM_LIMIT,
+    max_concurrency=MODEL_MAX_CONCURRENCY,
+)
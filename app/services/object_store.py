@@ -0,0 +1,161 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+# local = artifacts stay under STORAGE_ROOT only
+# s3    = STORAGE_ROOT is a scratch/cache dir; artifacts are mirrored to a bucket
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+
+S3_BUCKET = os.getenv("S3_BUCKET", "comicvault")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_REGION = os.getenv("S3_REGION") or None
+
+# Point at MinIO / moto_server / Supabase Storage's S3 endpoint instead of AWS
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+
+# Pooled HTTP connections, also the number of concurrent puts
+S3_MAX_CONNECTIONS = int(os.getenv("S3_MAX_CONNECTIONS", "32"))
+
+# Files above the threshold are streamed from disk as multipart uploads
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+S3_MULTIPART_CHUNK_SIZE = int(os.getenv("S3_MULTIPART_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+
+class LocalBackend:
+    """Objects are files under `root`; keys are paths relative to it."""
+
+    remote = False
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def put_file(self, key: str, path: Path) -> None:
+        target = self._path(key)
+        if target.resolve() == Path(path).resolve():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, target)
+
+    def get_file(self, key: str, dest: Path) -> bool:
+        source = self._path(key)
+        if not source.exists():
+            return False
+        if source.resolve() != Path(dest).resolve():
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, dest)
+        return True
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+
+class S3Backend:
+    """
+    Any S3-compatible object store (AWS, MinIO, moto_server, Supabase Storage).
+    One pooled boto3 client is shared by every thread.
+    """
+
+    remote = True
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: str = None,
+        region: str = None,
+        max_connections: int = S3_MAX_CONNECTIONS,
+        multipart_threshold: int = S3_MULTIPART_THRESHOLD,
+        multipart_chunk_size: int = S3_MULTIPART_CHUNK_SIZE,
+    ):
+        try:
+            # Optional, and slow to import: only loaded for STORAGE_BACKEND=s3
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            config=Config(max_pool_connections=max_connections, retries={"max_attempts": 5, "mode": "standard"}),
+        )
+        self._transfer = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunk_size,
+            max_concurrency=4,
+        )
+
+    def put_file(self, key: str, path: Path) -> None:
+        self._client.upload_file(str(path), self.bucket, self.prefix + key, Config=self._transfer)
+
+    def get_file(self, key: str, dest: Path) -> bool:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest.with_name(f"{dest.name}.{os.getpid()}.download")
+        try:
+            self._client.download_file(self.bucket, self.prefix + key, str(tmp_path), Config=self._transfer)
+        except self._client.exceptions.ClientError as e:
+            tmp_path.unlink(missing_ok=True)
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return False
+            raise
+        os.replace(tmp_path, dest)
+        return True
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self._client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return False
+            raise
+        return True
+
+    def delete(self, key: str) -> None:
+        self._client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+def make_backend(root: Path):
+    if STORAGE_BACKEND == "local":
+        return LocalBackend(root)
+    if STORAGE_BACKEND == "s3":
+        return S3Backend(S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'. Use 'local' or 's3'.")
+
+
+_executor = ThreadPoolExecutor(max_workers=S3_MAX_CONNECTIONS, thread_name_prefix="object-store")
+
+
+def _put(backend, key: str, path: Path, only_if_missing: bool) -> None:
+    if only_if_missing and backend.exists(key):
+        return
+    backend.put_file(key, path)
+
+
+def put_files(backend, root: Path, paths: Iterable[Path], if_missing: Iterable[Path] = ()) -> None:
+    """
+    Upload files under `root` concurrently, keyed by their relative path.
+    `if_missing` files (immutable content) are skipped when already stored.
+    """
+
+    if not backend.remote:
+        return
+
+    uploads = [(path, False) for path in paths] + [(path, True) for path in if_missing]
+    futures = [
+        _executor.submit(_put, backend, Path(path).relative_to(root).as_posix(), Path(path), only_if_missing)
+        for path, only_if_missing in uploads
+    ]
+    for future in futures:
+        future.result()
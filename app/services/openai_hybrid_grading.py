@@ -1,29 +1,82 @@
 import os
-import base64
-import json
+import asyncio
+import importlib
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
-from openai import OpenAI
+from app.services.algorithms import normalize_scores, compute_confidence, tables_digest
+from app.services import cpu_pool, grading_cache, metrics, model_scheduler, opinion_parsing, preprocessing
 
-from app.services.algorithms import normalize_scores, compute_confidence
+MODEL = os.getenv("OPENAI_GRADING_MODEL", "gpt-4.1-mini")
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Per-attempt ceiling for one AI opinion, in seconds (model_scheduler retries).
+AI_CALL_TIMEOUT = float(os.getenv("AI_CALL_TIMEOUT", "90"))
 
+# Connection pool shared by every in-flight grade on this worker.
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "50"))
 
-def _encode(path: Path) -> str:
-    b = path.read_bytes()
-    return f"data:image/jpeg;base64,{base64.b64encode(b).decode()}"
+# Ask for JSON output mode; turn off for OpenAI-compatible servers without it.
+AI_JSON_MODE = os.getenv("AI_JSON_MODE", "1") == "1"
 
+# Extra calls allowed per pass to fix a reply that didn't parse / validate.
+AI_REPAIR_ATTEMPTS = int(os.getenv("AI_REPAIR_ATTEMPTS", "1"))
 
-def _call_ai_grader(front_path: Path, back_path: Path, style: str) -> dict:
+# Point OPENAI_BASE_URL at a local fake of /chat/completions to test offline.
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Created by `open_clients()` during app warmup, or on first use. The openai
+# SDK is slow to import, so importing this module doesn't load it.
+async_client = None
+_opened = []
+
+
+def get_async_client():
+    global async_client
+    if async_client is None:
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        # Retries / rate limiting are model_scheduler's job, not the SDK's
+        async_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=OPENAI_BASE_URL,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=AI_MAX_CONNECTIONS,
+                    max_keepalive_connections=AI_MAX_CONNECTIONS,
+                ),
+            ),
+        )
+        _opened.append(async_client)
+    return async_client
+
+
+async def open_clients() -> None:
     """
-    One AI 'opinion' pass.
-    style = 'strict' or 'lenient' (slightly different wording to get variety).
+    Import the SDK off the event loop and create the pooled async client.
+    Without OPENAI_API_KEY the client is left for the first model call,
+    which then fails with the SDK's missing-credentials error.
     """
+    await asyncio.to_thread(importlib.import_module, "openai")
+    if os.getenv("OPENAI_API_KEY"):
+        get_async_client()
+
+
+async def close_clients() -> None:
+    """Close the clients this module created (their HTTP connection pools)."""
+    global async_client
+    while _opened:
+        opened = _opened.pop()
+        await opened.close()
+        if opened is async_client:
+            async_client = None
 
-    style_text = "Be slightly strict in scoring." if style == "strict" else "Be slightly lenient but honest."
 
-    system_prompt = f"""
+# Static instructions and schema, identical for every call so they form a
+# stable prompt prefix the provider can cache. What varies (the images, then
+# the style instruction) comes after it.
+_SYSTEM_PROMPT = """
 You are a professional comic book grader with deep experience (CGC-style).
 Analyze the FRONT and BACK cover images for:
 
@@ -35,12 +88,10 @@ Analyze the FRONT and BACK cover images for:
 - Centering and print alignment
 - Any signs of restoration (color touch, glue, trimming, pressing artifacts)
 
-{style_text}
-
 Return ONLY JSON. No extra commentary.
-Use this exact JSON structure:
+Each opinion uses this exact JSON structure:
 
-{{
+{
   "corners": number,
   "spine": number,
   "surface": number,
@@ -50,9 +101,36 @@ Use this exact JSON structure:
   "pressing_benefit": "none" | "low" | "medium" | "high",
   "page_color": "white" | "off-white" | "cream" | "tan" | "brittle",
   "notes": "short description of key defects and overall condition"
-}}
+}
 """
 
+_STYLE_TEXT = {
+    "strict": "Be slightly strict in scoring.",
+    "lenient": "Be slightly lenient but honest.",
+}
+
+# Pseudo-style for one call that returns both the strict and lenient opinions
+DUAL_STYLE = "both"
+
+_DUAL_TEXT = (
+    "Give two independent opinions and return both in one object: "
+    '{"strict": <opinion>, "lenient": <opinion>}. '
+    'For "strict", be slightly strict in scoring; for "lenient", be slightly lenient but honest.'
+)
+
+
+def _build_messages(front_url: str, back_url: str, style: str) -> list:
+    """
+    Build the chat messages for one AI call.
+    style = 'strict' or 'lenient' (one opinion, slightly different wording to
+    get variety), or DUAL_STYLE (both opinions in one reply).
+    """
+
+    if style == DUAL_STYLE:
+        style_text = _DUAL_TEXT
+    else:
+        style_text = f"{_STYLE_TEXT[style]} Return a single opinion."
+
     user_content = [
         {
             "type": "input_text",
@@ -60,43 +138,96 @@ Use this exact JSON structure:
         },
         {
             "type": "input_image",
-            "image_url": {"url": _encode(front_path)},
+            "image_url": {"url": front_url},
         },
         {
             "type": "input_image",
-            "image_url": {"url": _encode(back_path)},
+            "image_url": {"url": back_url},
+        },
+        {
+            "type": "input_text",
+            "text": style_text,
         },
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4.1-mini",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content},
-        ],
-        temperature=0.2,
-    )
+    return [
+        {"role": "system", "content": _SYSTEM_PROMPT},
+        {"role": "user", "content": user_content},
+    ]
+
+
+def _record_usage(response, front_url: str, back_url: str) -> None:
+    metrics.MODEL_PAYLOAD_BYTES.inc(len(front_url) + len(back_url))
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        metrics.MODEL_TOKENS.inc(usage.prompt_tokens or 0, kind="prompt")
+        metrics.MODEL_TOKENS.inc(usage.completion_tokens or 0, kind="completion")
 
+
+def _request_kwargs(messages: list) -> dict:
+    kwargs = {"model": MODEL, "messages": messages, "temperature": 0.2}
+    if AI_JSON_MODE:
+        kwargs["response_format"] = {"type": "json_object"}
+    return kwargs
+
+
+def _parse_opinion(response, style: str) -> Tuple[dict, Optional[opinion_parsing.OpinionParseError], str]:
+    """(opinion, None, content) on success, (None, error, content) when unusable."""
     content = response.choices[0].message.content
-    try:
-        data = json.loads(content)
-    except Exception:
-        raise ValueError("AI returned invalid JSON")
+    parse = opinion_parsing.parse_opinions if style == DUAL_STYLE else opinion_parsing.parse_opinion
+    with metrics.timed("parse"):
+        try:
+            return parse(content), None, content
+        except opinion_parsing.OpinionParseError as e:
+            return None, e, content
+
 
-    return data
+def _repair_messages(messages: list, content: str, error: opinion_parsing.OpinionParseError) -> list:
+    """The same conversation plus the bad reply and a request to fix it."""
+    return messages + [{"role": "assistant", "content": content or ""}, opinion_parsing.repair_message(error)]
 
 
-def grade_comic(front_path: Path, back_path: Path) -> dict:
+async def _call_ai_grader_async(front_url: str, back_url: str, style: str) -> dict:
     """
-    Hybrid grading:
-    - Two AI passes (strict + lenient)
-    - Scores normalized by algorithm
-    - Confidence computed from disagreement
+    One AI 'opinion' pass on the pooled async client, through the model
+    scheduler (rate limits, priority, retries, hedging, per-attempt timeout).
+    style = 'strict' or 'lenient' (slightly different wording to get variety),
+    or DUAL_STYLE for {"strict": opinion, "lenient": opinion} from one call.
+    Takes already-encoded data URLs so both passes share one encoding.
+    A reply that doesn't parse / validate is re-asked up to AI_REPAIR_ATTEMPTS times.
     """
 
-    # Two slightly different 'opinions'
-    opinion_strict = _call_ai_grader(front_path, back_path, style="strict")
-    opinion_lenient = _call_ai_grader(front_path, back_path, style="lenient")
+    messages = _build_messages(front_url, back_url, style)
+    for attempt in range(AI_REPAIR_ATTEMPTS + 1):
+        kwargs = _request_kwargs(messages)
+        try:
+            with metrics.MODEL_CALLS_IN_FLIGHT.track(), metrics.timed("ai_call"):
+                response = await model_scheduler.scheduler.call(
+                    lambda: get_async_client().chat.completions.create(**kwargs),
+                    timeout=AI_CALL_TIMEOUT,
+                )
+        except asyncio.TimeoutError:
+            metrics.MODEL_CALLS_TOTAL.inc(style=style, outcome="timeout")
+            raise TimeoutError(f"AI {style} pass timed out after {AI_CALL_TIMEOUT:.0f}s")
+        except Exception:
+            metrics.MODEL_CALLS_TOTAL.inc(style=style, outcome="error")
+            raise
+
+        _record_usage(response, front_url, back_url)
+        opinion, error, content = _parse_opinion(response, style)
+        if opinion is not None:
+            metrics.MODEL_CALLS_TOTAL.inc(style=style, outcome="repaired" if attempt else "ok")
+            return opinion
+
+        # Only this pass is re-asked; the other pass's opinion is kept
+        metrics.MODEL_CALLS_TOTAL.inc(style=style, outcome="invalid")
+        messages = _repair_messages(messages, content, error)
+
+    raise error
+
+
+def combine_opinions(opinion_strict: dict, opinion_lenient: dict) -> dict:
+    """Merge the strict + lenient opinions into the final grading result."""
 
     # Average raw scores for subgrades
     raw_scores = {}
@@ -127,4 +258,135 @@ def grade_comic(front_path: Path, back_path: Path) -> dict:
         "notes": notes,
         "confidence": confidence,
         "flags": flags,
+        # Raw opinions, so results can be re-scored offline without the model
+        "opinions": {"strict": opinion_strict, "lenient": opinion_lenient},
     }
+
+
+def _cache_key(kind: str, digests: Tuple[str, str], style: str) -> str:
+    if kind == "result":
+        # Results are scored with the algorithms tables; a table change must
+        # miss them (like a rescore rewrites saved ones), opinions stay valid
+        style = f"{style}:{tables_digest()}"
+    return grading_cache.make_key(kind, digests[0], digests[1], style, MODEL)
+
+
+def _cache_get(kind: str, digests: Optional[Tuple[str, str]], style: str) -> Optional[dict]:
+    if digests is None:
+        return None
+    return grading_cache.cache.get(_cache_key(kind, digests, style))
+
+
+def _cache_set(kind: str, digests: Optional[Tuple[str, str]], style: str, value: dict) -> None:
+    if digests is not None:
+        grading_cache.cache.set(_cache_key(kind, digests, style), value)
+
+
+def _digest(image) -> str:
+    if isinstance(image, preprocessing.ImageHandle):
+        return image.digest or grading_cache.file_digest(image.path)
+    return grading_cache.file_digest(image)
+
+
+def _image_digests(front_path, back_path) -> Optional[Tuple[str, str]]:
+    if not grading_cache.GRADING_CACHE_ENABLED:
+        return None
+    return _digest(front_path), _digest(back_path)
+
+
+async def _opinion_async(front_url: str, back_url: str, digests: Optional[Tuple[str, str]], style: str) -> dict:
+    opinion = await _call_ai_grader_async(front_url, back_url, style=style)
+    await asyncio.to_thread(_cache_set, "opinion", digests, style, opinion)
+    return opinion
+
+
+async def _dual_opinions_async(front_url: str, back_url: str, digests: Optional[Tuple[str, str]]) -> Dict[str, dict]:
+    """Strict + lenient opinions from one call; cached per style like separate passes."""
+    opinions = await _call_ai_grader_async(front_url, back_url, style=DUAL_STYLE)
+    for style, opinion in opinions.items():
+        await asyncio.to_thread(_cache_set, "opinion", digests, style, opinion)
+    return opinions
+
+
+async def resolve_digests(
+    front_path: Path, back_path: Path, digests: Optional[Dict[str, str]] = None
+) -> Optional[Tuple[str, str]]:
+    """Cache digests for a pair, reusing ones computed at upload time."""
+    if digests is not None and grading_cache.GRADING_CACHE_ENABLED:
+        return digests["front"], digests["back"]
+    return await asyncio.to_thread(_image_digests, front_path, back_path)
+
+
+async def get_opinions_async(
+    front_path: Path,
+    back_path: Path,
+    styles: List[str],
+    digests: Optional[Tuple[str, str]],
+    encoded: Optional[Dict[str, str]] = None,
+    single_call: bool = False,
+) -> Dict[str, dict]:
+    """
+    AI opinions for the requested styles, from the cache where possible;
+    missing ones are requested concurrently, or with `single_call` (when
+    both strict and lenient are missing) in one request.
+    `encoded` memoizes the data URLs across calls for the same comic.
+    """
+
+    opinions = {}
+    for style in styles:
+        opinions[style] = await asyncio.to_thread(_cache_get, "opinion", digests, style)
+
+    missing = [style for style, opinion in opinions.items() if opinion is None]
+    if missing:
+        # Encode once; every pass shares the same payload
+        encoded = encoded if encoded is not None else {}
+        if not encoded:
+            handles = [preprocessing.image_handle(front_path), preprocessing.image_handle(back_path)]
+            await cpu_pool.prepare_images(handles, ["payload"])
+            encoded["front"], encoded["back"] = [preprocessing.data_url(handle) for handle in handles]
+            for handle in handles:
+                handle.release()
+        if single_call and sorted(missing) == ["lenient", "strict"]:
+            opinions.update(await _dual_opinions_async(encoded["front"], encoded["back"], digests))
+        else:
+            fresh = await asyncio.gather(
+                *[_opinion_async(encoded["front"], encoded["back"], digests, style=style) for style in missing]
+            )
+            opinions.update(zip(missing, fresh))
+
+    return opinions
+
+
+async def grade_comic_async(
+    front_path: Path, back_path: Path, digests: Optional[Dict[str, str]] = None, single_call: bool = False
+) -> dict:
+    """
+    Hybrid grading:
+    - Two AI passes (strict + lenient)
+    - Scores normalized by algorithm
+    - Confidence computed from disagreement
+
+    Results and individual opinions are cached by image content, so a
+    re-upload of the same scans never calls the model again. Nothing
+    blocks the event loop:
+    - images are read/encoded once on the CPU pool
+    - strict + lenient passes run concurrently on the async client, or with
+      `single_call` come back together from one request (half the model
+      calls and image payload)
+    `digests` ({"front", "back"} sha256) skips re-hashing when the caller
+    already hashed the uploads while streaming them.
+    """
+
+    result_style = "dual" if single_call else "hybrid"
+    digests = await resolve_digests(front_path, back_path, digests)
+    cached = await asyncio.to_thread(_cache_get, "result", digests, result_style)
+    if cached is not None:
+        return cached
+
+    opinions = await get_opinions_async(
+        front_path, back_path, ["strict", "lenient"], digests, single_call=single_call
+    )
+
+    result = combine_opinions(opinions["strict"], opinions["lenient"])
+    await asyncio.to_thread(_cache_set, "result", digests, result_style, result)
+    return result
@@ -0,0 +1,121 @@
+"""
+Parse and validate one AI opinion from the model's reply.
+
+The model is asked for JSON output, but replies still come back wrapped in
+a ```json fence or with a sentence before / after the object. This pulls
+the object out, then checks it against the opinion schema with a pydantic
+model (validated by pydantic-core, built once at import):
+
+- the five subgrades: numbers (numeric strings coerced) in 0.5–10.0 (the CGC scale)
+- restoration_suspected: boolean (defaults to false)
+- pressing_benefit / page_color: one of the prompt's values, case-insensitive
+- notes: string
+
+`parse_opinions` does the same for a single-call reply carrying both the
+"strict" and "lenient" opinions.
+
+Anything that can't be extracted or doesn't match raises OpinionParseError,
+whose message is specific enough to send back to the model as a repair hint.
+"""
+
+import json
+from typing import Dict, Literal, Optional, Type
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+_decoder = json.JSONDecoder()
+
+
+class OpinionParseError(ValueError):
+    """The model's reply has no usable opinion JSON."""
+
+
+class Opinion(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    corners: float = Field(ge=0.5, le=10.0)
+    spine: float = Field(ge=0.5, le=10.0)
+    surface: float = Field(ge=0.5, le=10.0)
+    centering: float = Field(ge=0.5, le=10.0)
+    color: float = Field(ge=0.5, le=10.0)
+    restoration_suspected: bool = False
+    pressing_benefit: Optional[Literal["none", "low", "medium", "high"]] = None
+    page_color: Optional[Literal["white", "off-white", "cream", "tan", "brittle"]] = None
+    notes: str = ""
+
+    @field_validator("pressing_benefit", "page_color", mode="before")
+    @classmethod
+    def _lowercase(cls, value):
+        return value.strip().lower() if isinstance(value, str) else value
+
+
+class DualOpinion(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    strict: Opinion
+    lenient: Opinion
+
+
+def _extract(content: str) -> dict:
+    """Find the opinion object in a reply: bare, fenced, or embedded in text."""
+
+    # Decode from each "{" in turn; the first one that parses as a whole
+    # object wins, whatever fence or prose surrounds it.
+    start = content.find("{")
+    while start != -1:
+        try:
+            data, _ = _decoder.raw_decode(content, start)
+            return data
+        except json.JSONDecodeError:
+            start = content.find("{", start + 1)
+
+    raise OpinionParseError("reply contains no JSON object")
+
+
+def _describe(error: ValidationError) -> str:
+    problems = []
+    for item in error.errors()[:5]:
+        field = ".".join(str(part) for part in item["loc"]) or "opinion"
+        problems.append(f"{field}: {item['msg']}")
+    return "; ".join(problems)
+
+
+def _parse(model: Type[BaseModel], content: Optional[str]) -> dict:
+    if not content or not content.strip():
+        raise OpinionParseError("reply is empty")
+
+    # Well-formed replies (the common case under JSON mode) parse and
+    # validate in one pass; only the rest go through extraction.
+    try:
+        return model.model_validate_json(content).model_dump()
+    except ValidationError as e:
+        if not any(item["type"] == "json_invalid" for item in e.errors()):
+            raise OpinionParseError(_describe(e))
+
+    try:
+        return model.model_validate(_extract(content)).model_dump()
+    except ValidationError as e:
+        raise OpinionParseError(_describe(e))
+
+
+def parse_opinion(content: Optional[str]) -> dict:
+    """Return the validated opinion dict, or raise OpinionParseError."""
+    return _parse(Opinion, content)
+
+
+def parse_opinions(content: Optional[str]) -> Dict[str, dict]:
+    """Return {"strict": opinion, "lenient": opinion} from a dual reply, or raise OpinionParseError."""
+    return _parse(DualOpinion, content)
+
+
+def repair_message(error: OpinionParseError) -> dict:
+    """Follow-up user turn asking the model to fix its previous reply."""
+
+    return {
+        "role": "user",
+        "content": (
+            f"Your previous reply could not be used ({error}). "
+            "Reply again with ONLY the JSON object in the exact structure requested: "
+            "numeric subgrades from 0.5 to 10.0, no code fences, no commentary."
+        ),
+    }
@@ -1,47 +1,203 @@
+import io
+import os
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, Optional, Tuple, Union
 
+import numpy as np
 from PIL import Image, ImageOps, ImageEnhance
 
+try:
+    # Optional: lets Pillow open HEIC/HEIF phone scans.
+    from pillow_heif import register_heif_opener
 
-def _normalize_image(path: Path) -> Path:
-    """Basic preprocessing to make grading more consistent.
+    register_heif_opener()
+except ImportError:
+    pass
 
-    - convert to RGB
-    - auto-orient
-    - resize to reasonable max size
-    - slight contrast enhancement
-    """
-    img = Image.open(path)
+# Bounds for the payload sent to the AI grader
+MODEL_IMAGE_MAX_DIM = int(os.getenv("MODEL_IMAGE_MAX_DIM", "1536"))
+MODEL_IMAGE_FORMAT = os.getenv("MODEL_IMAGE_FORMAT", "JPEG").upper()  # JPEG or WEBP
+MODEL_IMAGE_QUALITY = int(os.getenv("MODEL_IMAGE_QUALITY", "85"))
 
-    # Ensure RGB
-    img = img.convert("RGB")
+PROCESSED_MAX_DIM = 2000
 
-    # Auto-orient based on EXIF
-    img = ImageOps.exif_transpose(img)
+# An ImageHandle decodes once at (at least) this size and every stage
+# derives from that; JPEGs are DCT-decoded straight at a reduced size.
+# The processed copy is the largest consumer, so 12 MP phone scans still
+# get the 1/2 DCT scale (2016x1512) instead of a full decode.
+DECODE_MAX_DIM = PROCESSED_MAX_DIM
 
-    # Resize if huge
-    max_dim = 2000
-    w, h = img.size
+# name -> (resampling filter, reducing_gap)
+# With a reducing_gap, JPEGs are DCT-decoded straight at >= the target size
+# and other formats are shrunk with integer `reduce` first, so the filter
+# only runs over the last ~gap x of the downscale. None = exact full decode.
+RESAMPLING_PRESETS = {
+    "fast": (Image.BILINEAR, 2.0),
+    "balanced": (Image.BICUBIC, 3.0),
+    "quality": (Image.LANCZOS, None),
+}
+PREPROCESS_PRESET = os.getenv("PREPROCESS_PRESET", "balanced")
+
+# Front and back are preprocessed side by side; Pillow releases the GIL
+# while decoding, resizing and encoding.
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", "4"))
+_executor = ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS, thread_name_prefix="preprocess")
+
+
+def _target_size(size: Tuple[int, int], max_dim: int) -> Tuple[int, int]:
+    w, h = size
     scale = min(max_dim / max(w, h), 1.0)
-    if scale < 1.0:
-        img = img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
+    return int(w * scale), int(h * scale)
+
+
+def _decode_oriented(img: Image.Image, max_dim: int, preset: str = PREPROCESS_PRESET) -> Image.Image:
+    """Auto-orient an opened image and convert to RGB, decoding JPEGs at >= max_dim."""
+    _, reducing_gap = RESAMPLING_PRESETS[preset]
+
+    # JPEGs: decode directly at a DCT-reduced size that is still >= target
+    target = _target_size(img.size, max_dim)
+    if reducing_gap is not None and target != img.size:
+        img.draft("RGB", target)
+
+    # Auto-orient based on EXIF (before convert, which drops the EXIF data)
+    img = ImageOps.exif_transpose(img)
+
+    # Ensure RGB
+    return img.convert("RGB")
+
+
+def _fit(img: Image.Image, max_dim: int, preset: str = PREPROCESS_PRESET) -> Image.Image:
+    """Cap the longest side at max_dim with the preset's filter."""
+    resample, reducing_gap = RESAMPLING_PRESETS[preset]
+    target = _target_size(img.size, max_dim)
+    if target != img.size:
+        img = img.resize(target, resample, reducing_gap=reducing_gap)
+    return img
+
+
+class ImageHandle:
+    """
+    One scan, decoded once and shared by every stage that looks at it
+    (local scorer, model payload, processed copy). The quality gate memoizes
+    its verdict here but samples the file itself.
+
+    - `image()`: the oriented RGB image, decoded at >= DECODE_MAX_DIM
+    - `gray()`: a uint8 array over its grayscale conversion
+    - `derive(name, fn)`: memoized derivatives (encoded payloads, stats, ...)
+    - `release()`: drop the pixel buffers once the derivatives are made;
+      they are decoded again only if something asks for pixels later
+
+    Safe to share across worker threads.
+    """
+
+    def __init__(self, path: Path, digest: Optional[str] = None, preset: str = PREPROCESS_PRESET):
+        self.path = Path(path)
+        self.digest = digest
+        self.preset = preset
+        self.size: Optional[Tuple[int, int]] = None  # original (width, height)
+
+        self._lock = threading.RLock()
+        self._image: Optional[Image.Image] = None
+        self._gray: Optional[np.ndarray] = None
+        self._derived: Dict[str, object] = {}
+
+    def image(self) -> Image.Image:
+        with self._lock:
+            if self._image is None:
+                img = Image.open(self.path)
+                self.size = img.size
+                self._image = _decode_oriented(img, DECODE_MAX_DIM, self.preset)
+            return self._image
+
+    def gray(self) -> np.ndarray:
+        with self._lock:
+            if self._gray is None:
+                self._gray = np.asarray(self.image().convert("L"), dtype=np.uint8)
+            return self._gray
+
+    def derive(self, name: str, fn: Callable[["ImageHandle"], object]):
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = fn(self)
+            return self._derived[name]
+
+    def has(self, name: str) -> bool:
+        return name in self._derived
+
+    def derived(self) -> Dict[str, object]:
+        with self._lock:
+            return dict(self._derived)
+
+    def prime(self, size: Optional[Tuple[int, int]], derived: Dict[str, object]) -> None:
+        """Adopt derivatives computed elsewhere (e.g. by a cpu_pool worker)."""
+        with self._lock:
+            self.size = self.size or size
+            for name, value in derived.items():
+                self._derived.setdefault(name, value)
+
+    def release(self) -> None:
+        with self._lock:
+            self._image = None
+            self._gray = None
+
+
+def image_handle(
+    image: Union[Path, ImageHandle], digest: Optional[str] = None, preset: str = PREPROCESS_PRESET
+) -> ImageHandle:
+    """Accept a path or an existing handle wherever an image is expected."""
+    return image if isinstance(image, ImageHandle) else ImageHandle(image, digest, preset)
+
+
+def _normalize_image(image: Union[Path, ImageHandle], preset: str = PREPROCESS_PRESET) -> Path:
+    """Basic preprocessing to make grading more consistent.
+
+    - auto-orient
+    - convert to RGB
+    - resize to reasonable max size (`preset` picks the speed/quality trade-off)
+    - slight contrast enhancement
+    """
+    handle = image_handle(image, preset=preset)
+    img = _fit(handle.image(), PROCESSED_MAX_DIM, preset)
 
     # Gentle contrast boost
     enhancer = ImageEnhance.Contrast(img)
     img = enhancer.enhance(1.05)
 
     # Save back to a new processed file
-    processed_path = path.parent.parent / "processed" / path.name
+    processed_path = handle.path.parent.parent / "processed" / handle.path.name
     processed_path.parent.mkdir(parents=True, exist_ok=True)
     img.save(processed_path, format="JPEG", quality=90)
 
     return processed_path
 
 
-def process_images(original_paths: Dict[str, Path], processed_dir: Path) -> Dict[str, Path]:
-    """Run preprocessing on front/back originals and return processed paths."""
-    processed = {}
-    for key, path in original_paths.items():
-        processed[key] = _normalize_image(path)
-    return processed
+def process_images(
+    original_paths: Dict[str, Union[Path, ImageHandle]], processed_dir: Path, preset: str = PREPROCESS_PRESET
+) -> Dict[str, Path]:
+    """Run preprocessing on front/back originals (paths or handles, in parallel) and return processed paths."""
+    futures = {key: _executor.submit(_normalize_image, image, preset) for key, image in original_paths.items()}
+    return {key: future.result() for key, future in futures.items()}
+
+
+def _encode_payload(handle: ImageHandle, max_dim: int, fmt: str, quality: int) -> Tuple[bytes, str]:
+    img = _fit(handle.image(), max_dim, handle.preset)
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=quality)
+    return buf.getvalue(), f"image/{fmt.lower()}"
+
+
+def data_url(image: Union[Path, ImageHandle]) -> str:
+    """
+    The model payload as a data URL, memoized on a handle: a JPEG/WebP
+    capped at MODEL_IMAGE_MAX_DIM, so huge phone scans shrink to a few
+    hundred KB.
+    """
+
+    def build(handle: ImageHandle) -> str:
+        payload, mime = _encode_payload(handle, MODEL_IMAGE_MAX_DIM, MODEL_IMAGE_FORMAT, MODEL_IMAGE_QUALITY)
+        return f"data:{mime};base64,{base64.b64encode(payload).decode()}"
+
+    return image_handle(image).derive("data_url", build)
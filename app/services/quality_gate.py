@@ -0,0 +1,119 @@
+"""
+Pre-flight check that rejects unusable scans before any grading work.
+
+Runs on a small grayscale sample of each image (JPEGs are DCT-decoded
+straight at reduced size), so a front/back pair takes a few milliseconds:
+
+- resolution: the original's short side must be at least QUALITY_MIN_SHORT_SIDE
+- exposure: mean brightness (the same statistic `grading` scores on) within bounds
+- detail: mean edge strength (also from `grading`) above a floor, which
+  catches blank / lens-cap / solid-color uploads
+- focus: variance of the Laplacian above a floor, which catches motion and
+  out-of-focus blur
+
+`check_scans` returns human-readable reasons per side; empty means usable.
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from app.services import grading, preprocessing
+
+QUALITY_GATE_ENABLED = os.getenv("QUALITY_GATE_ENABLED", "1") == "1"
+
+# Longest side of the analysis sample, in pixels
+QUALITY_SAMPLE_DIM = int(os.getenv("QUALITY_SAMPLE_DIM", "512"))
+
+QUALITY_MIN_SHORT_SIDE = int(os.getenv("QUALITY_MIN_SHORT_SIDE", "600"))
+
+# Mean brightness, 0–1
+QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "0.12"))
+QUALITY_MAX_BRIGHTNESS = float(os.getenv("QUALITY_MAX_BRIGHTNESS", "0.95"))
+
+# Mean edge strength on grading's 0–255 scale, measured on the sample
+QUALITY_MIN_EDGE_STRENGTH = float(os.getenv("QUALITY_MIN_EDGE_STRENGTH", "2.0"))
+
+# Variance of the 4-neighbour Laplacian on the sample
+QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "15.0"))
+
+
+def _load_sample(image: Union[Path, preprocessing.ImageHandle]):
+    """
+    (grayscale sample as uint8 array, original (width, height)).
+    Always taken from the file, also for a handle, so the verdict doesn't
+    depend on how the caller holds the image. The draft decode is cheaper
+    than the handle's full one, which a cached grade may never need.
+    """
+    path = image.path if isinstance(image, preprocessing.ImageHandle) else image
+    img = Image.open(path)
+    size = w, h = img.size
+    scale = min(QUALITY_SAMPLE_DIM / max(w, h), 1.0)
+    img.draft("L", (max(1, int(w * scale)), max(1, int(h * scale))))  # no-op for non-JPEGs
+    img = ImageOps.exif_transpose(img).convert("L")
+    img.thumbnail((QUALITY_SAMPLE_DIM, QUALITY_SAMPLE_DIM), Image.BILINEAR)
+    return np.asarray(img, dtype=np.uint8), size
+
+
+def _laplacian_variance(gray: np.ndarray) -> float:
+    x = gray.astype(np.float32)
+    lap = x[:-2, 1:-1] + x[2:, 1:-1] + x[1:-1, :-2] + x[1:-1, 2:] - 4.0 * x[1:-1, 1:-1]
+    return float(lap.var())
+
+
+def check_scan(image: Union[Path, preprocessing.ImageHandle]) -> List[str]:
+    """Reasons this scan should be retaken (empty list = good enough to grade); memoized on a handle."""
+    if isinstance(image, preprocessing.ImageHandle):
+        return list(image.derive("quality_issues", _check_scan))
+    return _check_scan(image)
+
+
+def _check_scan(image: Union[Path, preprocessing.ImageHandle]) -> List[str]:
+    try:
+        gray, (width, height) = _load_sample(image)
+    except Exception:
+        return ["could not be read as an image; upload a JPEG, PNG or HEIC photo"]
+
+    reasons = []
+    if min(width, height) < QUALITY_MIN_SHORT_SIDE:
+        reasons.append(
+            f"resolution too low ({width}x{height}); rescan with at least "
+            f"{QUALITY_MIN_SHORT_SIDE}px on the short side"
+        )
+
+    if min(gray.shape) < 3:
+        return reasons or ["image is too small to analyze"]
+
+    edge_strength, brightness = grading._stack_stats(gray[None])[0]
+    brightness /= 255.0
+    if brightness < QUALITY_MIN_BRIGHTNESS:
+        reasons.append(f"too dark (mean brightness {brightness:.0%}); add light or avoid shadows")
+    elif brightness > QUALITY_MAX_BRIGHTNESS:
+        reasons.append(f"overexposed (mean brightness {brightness:.0%}); reduce glare or lighting")
+
+    if edge_strength < QUALITY_MIN_EDGE_STRENGTH:
+        reasons.append("no visible detail; make sure the cover fills the frame")
+    else:
+        sharpness = _laplacian_variance(gray)
+        if sharpness < QUALITY_MIN_SHARPNESS:
+            reasons.append(
+                f"blurry (sharpness {sharpness:.0f}, need {QUALITY_MIN_SHARPNESS:.0f}); "
+                "hold the camera steady and let it focus"
+            )
+
+    return reasons
+
+
+def check_scans(paths: Dict[str, Union[Path, preprocessing.ImageHandle]]) -> Dict[str, List[str]]:
+    """Per-side reasons for the sides that failed; empty dict = all usable."""
+    if not QUALITY_GATE_ENABLED:
+        return {}
+    failed = {}
+    for side, image in paths.items():
+        reasons = check_scan(image)
+        if reasons:
+            failed[side] = reasons
+    return failed
@@ -1,15 +1,91 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from typing import Dict
+
+from app.services import cpu_pool, storage
+
+REPORT_FILENAME = "grading_report.pdf"
+REPORT_DIGEST_FILENAME = "grading_report.sha256"
+
+# Render the PDF right after grading instead of on first download
+REPORT_PRERENDER = os.getenv("REPORT_PRERENDER", "0") == "1"
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report")
+_pending: Dict[Path, Future] = {}
+_pending_lock = threading.RLock()
+
+
+def report_digest(user_id: str, comic_id: str, grading_result: dict) -> str:
+    """Hash of everything that ends up on the PDF."""
+    payload = json.dumps(
+        {"user_id": user_id, "comic_id": comic_id, "grading_result": grading_result},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def ensure_report(user_id: str, comic_id: str, grading_result: dict, report_dir: Path) -> Path:
+    """
+    Return the report PDF, rendering it only when it is missing or was
+    rendered from a different grading_result (tracked by a digest sidecar).
+    """
+
+    pdf_path = report_dir / REPORT_FILENAME
+    digest_path = report_dir / REPORT_DIGEST_FILENAME
+    digest = report_digest(user_id, comic_id, grading_result)
+
+    # Another instance may already have rendered it to the storage backend
+    if storage.fetch(pdf_path) and storage.fetch(digest_path) and digest_path.read_text(encoding="utf-8") == digest:
+        return pdf_path
+
+    generate_report(user_id, comic_id, grading_result, report_dir)
+    digest_path.write_text(digest, encoding="utf-8")
+    storage.persist([pdf_path, digest_path])
+    return pdf_path
+
+
+def submit_report(user_id: str, comic_id: str, grading_result: dict, report_dir: Path) -> Future:
+    """
+    Run `ensure_report` on the CPU pool (the report threads until it starts).
+    Concurrent requests for the same report share one render.
+    """
+
+    with _pending_lock:
+        future = _pending.get(report_dir)
+        if future is None:
+            future = cpu_pool.submit(ensure_report, user_id, comic_id, grading_result, report_dir, fallback=_executor)
+            _pending[report_dir] = future
+            future.add_done_callback(lambda done: _forget(report_dir, done))
+        return future
+
+
+def _forget(report_dir: Path, future: Future) -> None:
+    with _pending_lock:
+        if _pending.get(report_dir) is future:
+            del _pending[report_dir]
 
 
 def generate_report(user_id: str, comic_id: str, grading_result: dict, report_dir: Path) -> Path:
     """Generate a simple PDF grading report."""
-    
+
+    # Imported on first render (or by cpu_pool's warmup), not at app import
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
     report_dir.mkdir(parents=True, exist_ok=True)
-    pdf_path = report_dir / "grading_report.pdf"
+    pdf_path = report_dir / REPORT_FILENAME
+
+    # Render to a temp file so concurrent readers never see a partial PDF
+    tmp_path = report_dir / f".{REPORT_FILENAME}.{uuid.uuid4().hex}.tmp"
 
-    c = canvas.Canvas(str(pdf_path), pagesize=letter)
+    c = canvas.Canvas(str(tmp_path), pagesize=letter)
     w, h = letter
     y = h - 72
 
@@ -66,6 +142,7 @@ def generate_report(user_id: str, comic_id: str, grading_result: dict, report_di
 
     c.showPage()
     c.save()
+    os.replace(tmp_path, pdf_path)
 
     return pdf_path
 
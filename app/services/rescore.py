@@ -0,0 +1,208 @@
+"""
+Re-score saved grades after a change to the scoring tables in `algorithms`.
+
+    python -m app.services.rescore [--workers 4] [--chunk-size 500] [--dry-run] [--restart]
+
+Walks storage/users/*/comics/*/analysis/grading_result.json, recomputes the
+normalized subgrades, final grade and confidence from the raw AI opinions
+persisted with each result, and rewrites only the results that changed.
+Reports already rendered for a changed grade are re-rendered.
+The model is never called; results saved without opinions (local-only
+grades, or grades from before opinions were persisted) are skipped.
+Cached grading results are keyed by the tables too, so none outlive a change.
+
+Progress is checkpointed after every chunk, so an interrupted run picks up
+where it stopped; the checkpoint is removed once a run completes.
+Pass --restart to ignore it.
+"""
+
+import os
+import argparse
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.services import algorithms, reports, storage
+
+RESCORE_WORKERS = int(os.getenv("RESCORE_WORKERS", str(os.cpu_count() or 1)))
+RESCORE_CHUNK_SIZE = int(os.getenv("RESCORE_CHUNK_SIZE", "500"))
+RESCORE_CHECKPOINT = storage.STORAGE_ROOT / "rescore_checkpoint.json"
+
+_COUNTS = ["scanned", "rescored", "changed", "skipped", "errors", "reports"]
+
+
+def _chunks(comics: Iterator[Tuple[str, str]], size: int) -> Iterator[List[Tuple[str, str]]]:
+    chunk = []
+    for comic in comics:
+        chunk.append(comic)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def rescore_results(results: List[dict]) -> List[Optional[dict]]:
+    """
+    Recompute subgrades / final / confidence for many grading results at
+    once. Returns the updated result for each input, or None when it has no
+    persisted opinions to re-score from.
+    """
+
+    rows = [i for i, result in enumerate(results) if "strict" in (result.get("opinions") or {})]
+    rescored: List[Optional[dict]] = [None] * len(results)
+    if not rows:
+        return rescored
+
+    opinions = [results[i]["opinions"] for i in rows]
+    strict = algorithms.opinions_matrix([op["strict"] for op in opinions])
+    lenient = algorithms.opinions_matrix([op.get("lenient", op["strict"]) for op in opinions])
+
+    # Same math as combine_opinions: average the passes, then normalize
+    subgrades, finals = algorithms.normalize_scores_batch((strict + lenient) / 2.0)
+
+    # Two AI passes -> their disagreement; a lone AI pass keeps its fixed confidence
+    has_lenient = np.array(["lenient" in op for op in opinions])
+    confidence = algorithms.compute_confidence_batch(strict, lenient)
+
+    for row, i in enumerate(rows):
+        result = dict(results[i])
+        normalized = dict(zip(algorithms.SUBGRADE_KEYS, subgrades[row].tolist()))
+        normalized["final"] = float(finals[row])
+        result["subgrades"] = normalized
+        result["final"] = normalized["final"]
+        if has_lenient[row]:
+            result["confidence"] = float(confidence[row])
+        rescored[i] = result
+
+    return rescored
+
+
+def _rescore_chunk(comics: List[Tuple[str, str]], dry_run: bool) -> Dict[str, int]:
+    """Worker: load, re-score, and write back one chunk of comics."""
+
+    counts = dict.fromkeys(_COUNTS, 0)
+    loaded = []
+    for user_id, comic_id in comics:
+        dirs = storage.comic_directories(user_id, comic_id)
+        try:
+            result = storage.load_analysis(dirs["analysis"])
+        except ValueError:
+            counts["errors"] += 1
+            continue
+        if result is None:
+            continue
+        counts["scanned"] += 1
+        loaded.append((user_id, comic_id, dirs, result))
+
+    rescored = rescore_results([result for _, _, _, result in loaded])
+
+    for (user_id, comic_id, dirs, result), updated in zip(loaded, rescored):
+        if updated is None:
+            counts["skipped"] += 1
+            continue
+        counts["rescored"] += 1
+        if all(updated[key] == result.get(key) for key in ["subgrades", "final", "confidence"]):
+            continue
+
+        counts["changed"] += 1
+        if dry_run:
+            continue
+        storage.save_analysis(updated, dirs["analysis"])
+
+        # Unrendered reports pick up the new grade lazily on first download
+        if (dirs["reports"] / reports.REPORT_FILENAME).exists():
+            reports.ensure_report(user_id, comic_id, updated, dirs["reports"])
+            counts["reports"] += 1
+
+    return counts
+
+
+def _load_checkpoint(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+def _save_checkpoint(path: Path, checkpoint: dict) -> None:
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    tmp_path.write_text(json.dumps(checkpoint, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def rescore_all(
+    workers: int = RESCORE_WORKERS,
+    chunk_size: int = RESCORE_CHUNK_SIZE,
+    checkpoint_path: Path = RESCORE_CHECKPOINT,
+    dry_run: bool = False,
+    restart: bool = False,
+) -> Dict[str, int]:
+    """
+    Re-score the whole storage tree on a process pool.
+    Chunks may finish out of order; the checkpoint only advances past a
+    chunk once every chunk before it is done.
+    """
+
+    checkpoint = {} if restart or dry_run else _load_checkpoint(checkpoint_path)
+    after = tuple(checkpoint["done_through"]) if checkpoint.get("done_through") else None
+    totals = {key: checkpoint.get(key, 0) for key in _COUNTS}
+
+    chunks = enumerate(_chunks(storage.iter_comics(after), chunk_size))
+    pending = {}
+    finished: Dict[int, Tuple[Tuple[str, str], Dict[str, int]]] = {}
+    next_to_commit = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # Keep a bounded number of chunks in flight so the walk stays streaming
+            while len(pending) < workers * 2:
+                item = next(chunks, None)
+                if item is None:
+                    break
+                index, chunk = item
+                pending[pool.submit(_rescore_chunk, chunk, dry_run)] = (index, chunk[-1])
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, last = pending.pop(future)
+                finished[index] = (last, future.result())
+
+            while next_to_commit in finished:
+                last, counts = finished.pop(next_to_commit)
+                next_to_commit += 1
+                for key in _COUNTS:
+                    totals[key] += counts[key]
+                if not dry_run:
+                    _save_checkpoint(checkpoint_path, {"done_through": list(last), **totals})
+
+    # Finished: the next run (after the next weight change) starts from the top
+    if not dry_run:
+        checkpoint_path.unlink(missing_ok=True)
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-score saved grading results without calling the model.")
+    parser.add_argument("--workers", type=int, default=RESCORE_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=RESCORE_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", type=Path, default=RESCORE_CHECKPOINT)
+    parser.add_argument("--dry-run", action="store_true", help="Count what would change, write nothing.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    totals = rescore_all(args.workers, args.chunk_size, args.checkpoint, args.dry_run, args.restart)
+    totals["seconds"] = round(time.perf_counter() - start, 1)
+    print(json.dumps(totals))
+
+
+if __name__ == "__main__":
+    main()
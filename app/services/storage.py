@@ -1,52 +1,340 @@
+import asyncio
+import hashlib
 import json
+import os
+import shutil
+import time
+import uuid
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterator, Optional, Tuple
+
+from app.services import metrics, object_store
 
 BASE_DIR = Path(__file__).resolve().parents[2]
-STORAGE_ROOT = BASE_DIR / "storage"
+
+# Local working tree. With STORAGE_BACKEND=s3 it is only a scratch/cache
+# directory and every saved artifact is mirrored to the bucket.
+STORAGE_ROOT = Path(os.getenv("STORAGE_ROOT", str(BASE_DIR / "storage")))
 USERS_ROOT = STORAGE_ROOT / "users"
 TEMP_UPLOADS_ROOT = STORAGE_ROOT / "temp_uploads"
 
+# Content-addressed originals: blobs/sha256/<2 hex>/<digest>, hardlinked
+# into each comic's original/ dir and reference-counted in the comic index.
+BLOBS_ROOT = STORAGE_ROOT / "blobs" / "sha256"
 
-def create_comic_directories(user_id: str, comic_id: str) -> Dict[str, Path]:
-    """Create the full directory tree for a user's comic (Platinum version)."""
+# Unreferenced blobs younger than this are left alone by gc_blobs
+# (they may belong to an upload that hasn't recorded its refs yet).
+BLOB_GC_GRACE_SECONDS = 3600
+
+# Uploads are copied to disk in chunks of this size, never read whole.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+backend = object_store.make_backend(STORAGE_ROOT)
 
-    base = USERS_ROOT / user_id / "comics" / comic_id
-    original = base / "original"
-    analysis = base / "analysis"
-    reports = base / "reports"
 
-    for path in [original, analysis, reports]:
-        path.mkdir(parents=True, exist_ok=True)
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
 
+
+def comic_directories(user_id: str, comic_id: str) -> Dict[str, Path]:
+    """Paths of a user's comic tree, without creating anything."""
+
+    base = USERS_ROOT / user_id / "comics" / comic_id
     return {
         "base": base,
-        "original": original,
-        "analysis": analysis,
-        "reports": reports,
+        "original": base / "original",
+        "analysis": base / "analysis",
+        "reports": base / "reports",
     }
 
 
-async def save_original_uploads(front_file, back_file, original_dir: Path) -> Dict[str, Path]:
-    """Save uploaded front/back images into original/."""
+def iter_comics(after: Optional[Tuple[str, str]] = None) -> Iterator[Tuple[str, str]]:
+    """
+    (user_id, comic_id) for every comic under USERS_ROOT, in sorted order,
+    one directory listing at a time. `after` skips everything up to and
+    including that comic.
+    """
+
+    if not USERS_ROOT.is_dir():
+        return
+
+    for user_id in sorted(os.listdir(USERS_ROOT)):
+        if after is not None and user_id < after[0]:
+            continue
+        comics_dir = USERS_ROOT / user_id / "comics"
+        if not comics_dir.is_dir():
+            continue
+        for comic_id in sorted(os.listdir(comics_dir)):
+            if after is not None and (user_id, comic_id) <= after:
+                continue
+            yield user_id, comic_id
+
+
+def create_comic_directories(user_id: str, comic_id: str) -> Dict[str, Path]:
+    """Create the full directory tree for a user's comic (Platinum version)."""
+
+    dirs = comic_directories(user_id, comic_id)
+    for key in ["original", "analysis", "reports"]:
+        dirs[key].mkdir(parents=True, exist_ok=True)
+
+    return dirs
+
+
+def blob_path(digest: str) -> Path:
+    return BLOBS_ROOT / digest[:2] / digest
+
+
+def _commit_blob(tmp_path: Path, digest: str) -> Path:
+    """Move a fully written temp file into the blob store, unless that content is already there."""
+
+    path = blob_path(digest)
+    if path.exists():
+        tmp_path.unlink(missing_ok=True)
+        metrics.BLOB_DEDUP_TOTAL.inc()
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Read-only: every comic that links this blob shares the same inode
+    os.chmod(tmp_path, 0o444)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _link_blob(blob: Path, dest_path: Path) -> None:
+    """Hardlink a blob into a comic dir (plain copy where hardlinks aren't possible)."""
+
+    dest_path.unlink(missing_ok=True)
+    try:
+        os.link(blob, dest_path)
+    except OSError:
+        shutil.copyfile(blob, dest_path)
+
+
+def _place(tmp_path: Path, dest_path: Path, digest: str, dedupe: bool) -> None:
+    if dedupe:
+        _link_blob(_commit_blob(tmp_path, digest), dest_path)
+    else:
+        os.replace(tmp_path, dest_path)
+
+
+async def stream_upload(
+    upload, dest_path: Path, max_bytes: int = MAX_UPLOAD_BYTES, dedupe: bool = False
+) -> Tuple[Path, str]:
+    """
+    Copy an UploadFile to dest_path in fixed-size chunks.
+    - hashes (sha256) and size-checks while streaming
+    - writes to a temp file under temp_uploads/, then renames into place
+    - with `dedupe`, the content goes to the blob store (once per digest)
+      and dest_path becomes a hardlink to it
+    Returns (dest_path, sha256 hex digest).
+    """
+
+    TEMP_UPLOADS_ROOT.mkdir(parents=True, exist_ok=True)
+    tmp_path = TEMP_UPLOADS_ROOT / f"{uuid.uuid4().hex}.part"
+
+    digest = hashlib.sha256()
+    size = 0
+    fh = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"{upload.filename or 'upload'} exceeds the {max_bytes} byte upload limit")
+
+            digest.update(chunk)
+            await asyncio.to_thread(fh.write, chunk)
+
+        await asyncio.to_thread(fh.close)
+        await asyncio.to_thread(_place, tmp_path, dest_path, digest.hexdigest(), dedupe)
+    except BaseException:
+        fh.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    metrics.UPLOAD_BYTES.inc(size)
+
+    return dest_path, digest.hexdigest()
+
+
+async def upload_digest(upload, max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    """
+    sha256 of an UploadFile's (already spooled) content without saving it,
+    size-checked the same way as `stream_upload`. Rewinds the upload after.
+    """
+
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(f"{upload.filename or 'upload'} exceeds the {max_bytes} byte upload limit")
+        digest.update(chunk)
+
+    await upload.seek(0)
+    return digest.hexdigest()
+
+
+def copy_stream(
+    src, dest_path: Path, name: str, max_bytes: int = MAX_UPLOAD_BYTES, dedupe: bool = False
+) -> Tuple[Path, str]:
+    """
+    Blocking counterpart of `stream_upload` for plain file objects
+    (e.g. members of an uploaded zip). Same chunking, hashing, size cap,
+    temp-file + rename and blob dedupe.
+    """
+
+    TEMP_UPLOADS_ROOT.mkdir(parents=True, exist_ok=True)
+    tmp_path = TEMP_UPLOADS_ROOT / f"{uuid.uuid4().hex}.part"
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as fh:
+            while True:
+                chunk = src.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"{name} exceeds the {max_bytes} byte upload limit")
+
+                digest.update(chunk)
+                fh.write(chunk)
+
+        _place(tmp_path, dest_path, digest.hexdigest(), dedupe)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    metrics.UPLOAD_BYTES.inc(size)
+
+    return dest_path, digest.hexdigest()
+
+
+async def save_original_uploads_with_digests(
+    front_file, back_file, original_dir: Path
+) -> Tuple[Dict[str, Path], Dict[str, str]]:
+    """
+    Stream front/back into original/ and return (paths, sha256 digests).
+    Identical scans already on disk are linked, not written again.
+    """
 
     # Safety: filenames can be None depending on frontend
-    front_name = front_file.filename or "front.jpg"
-    back_name = back_file.filename or "back.jpg"
+    front_name = Path(front_file.filename or "front.jpg").name
+    back_name = Path(back_file.filename or "back.jpg").name
+
+    (front_path, front_digest), (back_path, back_digest) = await asyncio.gather(
+        stream_upload(front_file, original_dir / f"front_{front_name}", dedupe=True),
+        stream_upload(back_file, original_dir / f"back_{back_name}", dedupe=True),
+    )
+
+    digests = {"front": front_digest, "back": back_digest}
+    await asyncio.to_thread(add_original_refs, original_dir, digests)
+    return {"front": front_path, "back": back_path}, digests
+
+
+def _comic_ids(comic_dir: Path) -> Tuple[str, str]:
+    """(user_id, comic_id) of a users/<user_id>/comics/<comic_id> dir."""
+    return comic_dir.parent.parent.name, comic_dir.name
+
+
+def add_original_refs(original_dir: Path, digests: Dict[str, str]) -> None:
+    """Count a comic's originals as references to their blobs."""
+    from app.services import comic_index
+
+    comic_index.add_blob_refs(*_comic_ids(original_dir.parent), digests)
+
+
+def _release_blob(digest: str) -> bool:
+    """
+    Delete this instance's copy of a blob nothing here points at any more
+    (no index refs, no hardlinks).
+
+    The copy in a remote backend is left alone: refcounts live in this
+    instance's index, and comics indexed on other instances may still use it.
+    """
+    from app.services import comic_index
+
+    if comic_index.blob_refcount(digest) > 0:
+        return False
+
+    path = blob_path(digest)
+    try:
+        if path.stat().st_nlink > 1:
+            return False
+        path.unlink()
+    except FileNotFoundError:
+        pass
+    return True
 
-    front_bytes = await front_file.read()
-    back_bytes = await back_file.read()
 
-    front_path = original_dir / f"front_{front_name}"
-    back_path = original_dir / f"back_{back_name}"
+def delete_comic(user_id: str, comic_id: str) -> bool:
+    """
+    Remove a comic's tree, index row and blob references, then any blobs
+    left unreferenced. Returns False if there was no such comic.
+    """
+    from app.services import comic_index
+
+    dirs = comic_directories(user_id, comic_id)
+    released = comic_index.delete_comic(user_id, comic_id)
+    if released is None and not dirs["base"].exists():
+        return False
+
+    shutil.rmtree(dirs["base"], ignore_errors=True)
+    if backend.remote:
+        for path in [
+            dirs["analysis"] / "grading_result.json",
+            dirs["reports"] / "grading_report.pdf",
+            dirs["reports"] / "grading_report.sha256",
+        ]:
+            backend.delete(path.relative_to(STORAGE_ROOT).as_posix())
 
-    front_path.write_bytes(front_bytes)
-    back_path.write_bytes(back_bytes)
+    for digest in set(released or []):
+        _release_blob(digest)
+    return True
+
+
+def gc_blobs() -> int:
+    """
+    Sweep local blobs with no references (e.g. from aborted uploads); returns
+    how many were removed. Remote copies are never deleted from here.
+    """
+
+    removed = 0
+    cutoff = time.time() - BLOB_GC_GRACE_SECONDS
+    for path in BLOBS_ROOT.glob("*/*"):
+        try:
+            if path.stat().st_mtime > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        if _release_blob(path.name):
+            removed += 1
+    return removed
+
+
+async def save_original_uploads(front_file, back_file, original_dir: Path) -> Dict[str, Path]:
+    """Save uploaded front/back images into original/."""
 
-    return {"front": front_path, "back": back_path}
+    paths, _ = await save_original_uploads_with_digests(front_file, back_file, original_dir)
+    return paths
 
 
-def save_analysis(grading_result: dict, analysis_dir: Path) -> Path:
+def save_analysis(
+    grading_result: dict,
+    analysis_dir: Path,
+    digests: Optional[Dict[str, str]] = None,
+    original_paths: Optional[Dict[str, Path]] = None,
+) -> Path:
     """
     Save the COMPLETE grading_result JSON (not just subgrades).
     This includes:
@@ -55,8 +343,51 @@ def save_analysis(grading_result: dict, analysis_dir: Path) -> Path:
     - notes
     - confidence
     - flags (restoration, pressing benefit, page color)
+
+    The comic index row is written in the same step: the JSON only replaces
+    the old one once the index transaction is ready to commit.
+    The JSON and the original blobs are then put to the storage backend
+    together (blobs only if the bucket doesn't have them yet).
     """
+    from app.services import comic_index
+
+    user_id, comic_id = _comic_ids(analysis_dir.parent)
 
     analysis_path = analysis_dir / "grading_result.json"
-    analysis_path.write_text(json.dumps(grading_result, indent=2), encoding="utf-8")
+    tmp_path = analysis_path.with_name(f"{analysis_path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(json.dumps(grading_result, indent=2), encoding="utf-8")
+    try:
+        with comic_index.transaction() as conn:
+            comic_index.upsert(conn, user_id, comic_id, grading_result, digests, original_paths)
+            os.replace(tmp_path, analysis_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    persist([analysis_path], blobs=[blob_path(digest) for digest in (digests or {}).values()])
     return analysis_path
+
+
+def load_analysis(analysis_dir: Path) -> Optional[dict]:
+    """Read back a saved grading_result, or None if the comic has none."""
+
+    analysis_path = analysis_dir / "grading_result.json"
+    if not fetch(analysis_path):
+        return None
+    return json.loads(analysis_path.read_text(encoding="utf-8"))
+
+
+def persist(paths, blobs=()) -> None:
+    """
+    Put local artifacts, plus any content blobs the backend doesn't have
+    yet, to the storage backend concurrently. No-op for the local backend.
+    """
+    object_store.put_files(backend, STORAGE_ROOT, paths, if_missing=blobs)
+
+
+def fetch(path: Path) -> bool:
+    """Make sure an artifact is present locally, pulling it from the backend if needed."""
+    if path.exists():
+        return True
+    if not backend.remote:
+        return False
+    return backend.get_file(path.relative_to(STORAGE_ROOT).as_posix(), path)
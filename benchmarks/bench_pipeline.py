@@ -0,0 +1,309 @@
+"""
+Benchmark the scan -> grade -> report pipeline, stage by stage and end to end.
+
+    python benchmarks/bench_pipeline.py \
+        --resolutions 1200x1800,2000x3000,3024x4032 --repeat 5 \
+        --concurrency 1,8,32 --requests 64 --model-latency 0.5 \
+        --modes hybrid,dual --output bench_output.json
+
+The OpenAI client is replaced by a stub that returns canned JSON after
+`--model-latency` seconds, and all files go to a throwaway storage root,
+so runs are offline and repeatable. The end-to-end runs repeat for each
+grading mode in `--modes`. Results (latency percentiles per stage,
+end-to-end throughput and peak RSS) are written as JSON.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# Must be set before the services are imported
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["GRADING_CACHE_ENABLED"] = "0"
+# Synthetic scans are smooth noise with no line art; the gate would reject them.
+# Its cost is still measured below as its own stage.
+os.environ["QUALITY_GATE_ENABLED"] = "0"
+
+import httpx  # noqa: E402
+from starlette.datastructures import UploadFile  # noqa: E402
+
+from app.services import (  # noqa: E402
+    algorithms,
+    comic_index,
+    grading,
+    grading_cache,
+    object_store,
+    openai_hybrid_grading,
+    preprocessing,
+    quality_gate,
+    reports,
+    storage,
+)
+
+CANNED_OPINION = {
+    "corners": 8.5,
+    "spine": 8.0,
+    "surface": 9.0,
+    "centering": 8.5,
+    "color": 9.0,
+    "restoration_suspected": False,
+    "pressing_benefit": "low",
+    "page_color": "white",
+    "notes": "Light spine stress, sharp corners, strong gloss.",
+}
+
+
+def _canned_response(messages: list):
+    content = CANNED_OPINION
+    last = messages[-1]["content"]
+    if isinstance(last, list) and any(part.get("text") == openai_hybrid_grading._DUAL_TEXT for part in last):
+        # dual mode: both opinions from one call
+        content = {"strict": CANNED_OPINION, "lenient": dict(CANNED_OPINION, corners=8.0)}
+    message = SimpleNamespace(content=json.dumps(content))
+    usage = SimpleNamespace(prompt_tokens=1500, completion_tokens=120, total_tokens=1620)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def install_stub_client(latency: float) -> None:
+    """Swap the OpenAI client for a stub with a fixed response latency."""
+
+    async def create_async(**kwargs):
+        await asyncio.sleep(latency)
+        return _canned_response(kwargs["messages"])
+
+    openai_hybrid_grading.async_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create_async))
+    )
+
+
+def use_storage_root(root: Path) -> None:
+    """Point every path derived from STORAGE_ROOT at `root`, so nothing lands in the repo's storage/."""
+    storage.STORAGE_ROOT = root
+    storage.USERS_ROOT = root / "users"
+    storage.TEMP_UPLOADS_ROOT = root / "temp_uploads"
+    storage.BLOBS_ROOT = root / "blobs" / "sha256"
+    storage.backend = object_store.make_backend(root)
+    comic_index.COMIC_INDEX_PATH = root / "index.sqlite3"
+    grading_cache.cache.root = root / "cache" / "grading"
+
+
+def synthetic_scan(width: int, height: int, seed: int) -> bytes:
+    """A JPEG with smooth structure plus sensor-like noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.sin(x / 37.0) * 55 + np.cos(y / 51.0) * 55 + 128
+    arr = np.clip(base[..., None] + rng.normal(0, 10, (height, width, 3)), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, format="JPEG", quality=92)
+    return buf.getvalue()
+
+
+def percentiles(samples) -> dict:
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "n": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+async def bench_stages(front: bytes, back: bytes, repeat: int) -> dict:
+    timings = {
+        name: []
+        for name in [
+            "storage.save_original_uploads",
+            "quality_gate.check_scan",
+            "preprocessing.process_images",
+            "grading.grade_comic",
+            "openai_hybrid_grading.grade_comic_async",
+            "algorithms.normalize_scores",
+            "storage.save_analysis",
+            "reports.generate_report",
+        ]
+    }
+
+    for _ in range(repeat):
+        comic_id = str(uuid.uuid4())
+        dirs = storage.create_comic_directories("bench-user", comic_id)
+        uploads = [
+            UploadFile(file=io.BytesIO(front), filename="front.jpg"),
+            UploadFile(file=io.BytesIO(back), filename="back.jpg"),
+        ]
+
+        start = time.perf_counter()
+        original_paths = await storage.save_original_uploads(uploads[0], uploads[1], dirs["original"])
+        timings["storage.save_original_uploads"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for path in original_paths.values():
+            quality_gate.check_scan(path)
+        timings["quality_gate.check_scan"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        processed_paths = preprocessing.process_images(original_paths, dirs["base"] / "processed")
+        timings["preprocessing.process_images"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        grading.grade_comic(processed_paths)
+        timings["grading.grade_comic"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        grading_result = await openai_hybrid_grading.grade_comic_async(original_paths["front"], original_paths["back"])
+        timings["openai_hybrid_grading.grade_comic_async"].append(time.perf_counter() - start)
+
+        raw_scores = {key: CANNED_OPINION[key] for key in ["corners", "spine", "surface", "centering", "color"]}
+        start = time.perf_counter()
+        for _ in range(100):
+            algorithms.normalize_scores(raw_scores)
+        timings["algorithms.normalize_scores"].append((time.perf_counter() - start) / 100)
+
+        start = time.perf_counter()
+        storage.save_analysis(grading_result, dirs["analysis"])
+        timings["storage.save_analysis"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        reports.generate_report("bench-user", comic_id, grading_result, dirs["reports"])
+        timings["reports.generate_report"].append(time.perf_counter() - start)
+
+    return {name: percentiles(samples) for name, samples in timings.items()}
+
+
+async def bench_end_to_end(front: bytes, back: bytes, concurrency: int, requests: int, mode: str) -> dict:
+    from main import app
+
+    latencies = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            async def one() -> None:
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post(
+                        "/api/comics/grade",
+                        data={"user_id": "bench-user", "mode": mode},
+                        files={
+                            "front": ("front.jpg", front, "image/jpeg"),
+                            "back": ("back.jpg", back, "image/jpeg"),
+                        },
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*[one() for _ in range(requests)])
+            wall = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "requests": requests,
+        "statuses": {str(code): count for code, count in statuses.items()},
+        "throughput_rps": round(requests / wall, 2),
+        "latency": percentiles(latencies),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _parse_resolution(text: str):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+async def run(args) -> dict:
+    resolutions = [_parse_resolution(r) for r in args.resolutions.split(",")]
+    concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+    modes = args.modes.split(",")
+
+    results = {
+        "config": {
+            "resolutions": args.resolutions,
+            "repeat": args.repeat,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "modes": args.modes,
+            "model_latency_s": args.model_latency,
+        },
+        "stages": {},
+        "end_to_end": {},
+    }
+
+    for width, height in resolutions:
+        label = f"{width}x{height}"
+        front, back = synthetic_scan(width, height, 1), synthetic_scan(width, height, 2)
+
+        stages = await bench_stages(front, back, args.repeat)
+        stages["peak_rss_mb"] = peak_rss_mb()
+        results["stages"][label] = stages
+
+        results["end_to_end"][label] = [
+            await bench_end_to_end(front, back, concurrency, args.requests, mode)
+            for mode in modes
+            for concurrency in concurrency_levels
+        ]
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", default="1200x1800,2000x3000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--concurrency", default="1,8")
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--model-latency", type=float, default=0.5)
+    parser.add_argument("--modes", default="hybrid,dual")
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args()
+
+    install_stub_client(args.model_latency)
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    use_storage_root(workdir / "storage")
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    for label, stages in results["stages"].items():
+        print(f"== {label}")
+        for name, stats in stages.items():
+            if isinstance(stats, dict):
+                print(f"  {name:<40} p50 {stats['p50_ms']:>9.2f} ms   p95 {stats['p95_ms']:>9.2f} ms")
+        for run_stats in results["end_to_end"][label]:
+            print(
+                f"  end-to-end {run_stats['mode']:<6} c={run_stats['concurrency']:<3} "
+                f"{run_stats['throughput_rps']:>7.2f} req/s   p95 {run_stats['latency']['p95_ms']:.1f} ms"
+            )
+    print(f"peak RSS {peak_rss_mb()} MB -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
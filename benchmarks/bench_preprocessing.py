@@ -0,0 +1,112 @@
+"""
+Preprocessing benchmark: legacy full-decode + LANCZOS vs. the draft/reduce presets.
+
+    python benchmarks/bench_preprocessing.py [--width 4032 --height 3024 --repeat 5]
+
+Each variant runs in a fresh process so peak RSS is comparable.
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageOps
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.services import preprocessing  # noqa: E402
+
+
+def _legacy_normalize(path: Path) -> Path:
+    """The original `_normalize_image`: full decode, RGB, EXIF, LANCZOS, serial."""
+    img = Image.open(path)
+    img = img.convert("RGB")
+    img = ImageOps.exif_transpose(img)
+    w, h = img.size
+    scale = min(2000 / max(w, h), 1.0)
+    if scale < 1.0:
+        img = img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
+    img = ImageEnhance.Contrast(img).enhance(1.05)
+    processed_path = path.parent.parent / "processed" / path.name
+    processed_path.parent.mkdir(parents=True, exist_ok=True)
+    img.save(processed_path, format="JPEG", quality=90)
+    return processed_path
+
+
+def make_phone_scan(path: Path, width: int, height: int, seed: int) -> None:
+    """Synthetic landscape-sensor JPEG tagged with EXIF orientation 6 (portrait)."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.sin(x / 40.0) * 50 + np.cos(y / 55.0) * 50 + 128
+    arr = np.clip(base[..., None] + rng.normal(0, 12, (height, width, 3)), 0, 255).astype(np.uint8)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    Image.fromarray(arr).save(path, format="JPEG", quality=92, exif=exif)
+
+
+def _run_variant(variant: str, originals: dict, repeat: int, queue) -> None:
+    timings = []
+    sizes = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if variant == "legacy":
+            out = {key: _legacy_normalize(path) for key, path in originals.items()}
+        else:
+            out = preprocessing.process_images(originals, None, preset=variant)
+        timings.append(time.perf_counter() - start)
+        sizes = {key: Image.open(path).size for key, path in out.items()}
+
+    queue.put(
+        {
+            "variant": variant,
+            "mean_ms": round(1000 * sum(timings) / len(timings), 1),
+            "min_ms": round(1000 * min(timings), 1),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "output_sizes": sizes,
+        }
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_preprocessing_"))
+    try:
+        original_dir = workdir / "original"
+        original_dir.mkdir()
+        originals = {key: original_dir / f"{key}.jpg" for key in ["front", "back"]}
+
+        # Generate inputs in a child too: peak RSS survives exec, so a fat
+        # parent would inflate every variant's number.
+        ctx = multiprocessing.get_context("spawn")
+        for seed, path in enumerate(originals.values()):
+            proc = ctx.Process(target=make_phone_scan, args=(path, args.width, args.height, seed))
+            proc.start()
+            proc.join()
+
+        results = []
+        for variant in ["legacy", *preprocessing.RESAMPLING_PRESETS]:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_variant, args=(variant, originals, args.repeat, queue))
+            proc.start()
+            results.append(queue.get())
+            proc.join()
+
+        print(json.dumps({"input": [args.width, args.height], "results": results}, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Cold-start budget check: how long `import main` takes, and which heavy
+packages it drags in.
+
+    python benchmarks/check_import_time.py [--budget-ms 500 --repeat 5 --serve]
+
+Runs `python -X importtime -c "import main"` in fresh processes and takes the
+median. Exits non-zero when the import is over budget or loads a package
+that should wait for first use / the lifespan warmup (`--forbid`).
+
+With `--serve` it also starts uvicorn and reports how long after process
+start `/health` and `/ready` first answer 200.
+"""
+import argparse
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# "import time: <self us> | <cumulative us> | <indent><module>"
+_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)")
+
+
+def import_profile() -> Dict[str, int]:
+    """Cumulative import time in microseconds per module, for one fresh `import main`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import main failed:\n{result.stderr[-2000:]}")
+
+    profile = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            profile[match.group(2)] = int(match.group(1))
+    return profile
+
+
+def _heaviest_packages(profile: Dict[str, int], count: int):
+    packages = {}
+    for module, cumulative in profile.items():
+        root = module.split(".")[0]
+        packages[root] = max(packages.get(root, 0), cumulative)
+    packages.pop("main", None)
+    return sorted(packages.items(), key=lambda item: -item[1])[:count]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url: str, start: float, timeout: float) -> Optional[float]:
+    while time.monotonic() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.monotonic() - start
+        except OSError:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def serve_timings(timeout: float = 30.0) -> Dict[str, Optional[float]]:
+    """Seconds from spawning uvicorn until /health and /ready first return 200."""
+    port = _free_port()
+    start = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        health = _wait_for(f"{base}/health", start, timeout)
+        ready = _wait_for(f"{base}/ready", start, timeout)
+        return {"health": health, "ready": ready}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=500.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--forbid", default="openai,reportlab,boto3")
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--serve", action="store_true")
+    args = parser.parse_args()
+
+    import_profile()  # warm .pyc / filesystem caches; not counted
+    profiles = [import_profile() for _ in range(args.repeat)]
+    total_ms = statistics.median(profile["main"] for profile in profiles) / 1000
+    print(f"import main: {total_ms:.0f} ms (median of {args.repeat}, budget {args.budget_ms:.0f} ms)")
+    for package, cumulative in _heaviest_packages(profiles[-1], args.top):
+        print(f"  {package:<24} {cumulative / 1000:8.1f} ms")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"import main took {total_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    for package in filter(None, args.forbid.split(",")):
+        if any(module == package or module.startswith(package + ".") for module in profiles[-1]):
+            failures.append(f"`import main` loads {package}; import it lazily or in the lifespan warmup")
+
+    if args.serve:
+        timings = serve_timings()
+        for endpoint, seconds in timings.items():
+            shown = f"{seconds:.2f} s" if seconds is not None else "timed out"
+            print(f"/{endpoint} first 200 after {shown}")
+        if timings["health"] is None:
+            failures.append("/health never answered")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Local stand-in for the OpenAI chat completions API, with injectable latency
+and failures, for exercising the model scheduler (retries, rate limits,
+hedging) without a real key.
+
+    FAKE_LATENCY=0.5 FAKE_SLOW_RATE=0.05 FAKE_SLOW_LATENCY=5 \
+    FAKE_ERROR_RATE=0.1 FAKE_RATE_LIMIT_RATE=0.1 FAKE_RPM=600 \
+        uvicorn benchmarks.fake_openai:app --port 8765
+
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake uvicorn main:app
+
+Replies with one opinion, or {"strict": ..., "lenient": ...} when the last
+user message asks for both (`dual` mode).
+
+GET /stats returns call / error counts; POST /stats/reset clears them.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+FAKE_LATENCY = float(os.getenv("FAKE_LATENCY", "0.5"))
+
+# Tail latency: this fraction of calls takes FAKE_SLOW_LATENCY instead
+FAKE_SLOW_RATE = float(os.getenv("FAKE_SLOW_RATE", "0"))
+FAKE_SLOW_LATENCY = float(os.getenv("FAKE_SLOW_LATENCY", "5"))
+
+# Random failures: 500s and 429s (with Retry-After)
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+FAKE_RATE_LIMIT_RATE = float(os.getenv("FAKE_RATE_LIMIT_RATE", "0"))
+
+# Enforced requests/min over a sliding minute (0 = unlimited); excess gets 429
+FAKE_RPM = int(os.getenv("FAKE_RPM", "0"))
+
+OPINION = {
+    "corners": 8.0,
+    "spine": 7.5,
+    "surface": 8.5,
+    "centering": 9.0,
+    "color": 8.0,
+    "restoration_suspected": False,
+    "pressing_benefit": "low",
+    "page_color": "white",
+    "notes": "Light corner wear, clean spine.",
+}
+
+LENIENT_OPINION = dict(OPINION, corners=8.5, spine=8.0)
+
+app = FastAPI(title="Fake OpenAI")
+
+_stats = {"calls": 0, "ok": 0, "errors": 0, "rate_limited": 0, "slow": 0}
+_recent = deque()
+
+
+def _wants_both(messages: list) -> bool:
+    """The last user turn asks for a strict and a lenient opinion in one object."""
+    users = [message for message in messages if message.get("role") == "user"]
+    if not users:
+        return False
+    content = users[-1].get("content")
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content)
+    return '"strict"' in content and '"lenient"' in content
+
+
+def _rate_limited() -> bool:
+    if not FAKE_RPM:
+        return False
+    now = time.monotonic()
+    while _recent and now - _recent[0] > 60:
+        _recent.popleft()
+    if len(_recent) >= FAKE_RPM:
+        return True
+    _recent.append(now)
+    return False
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    _stats["calls"] += 1
+
+    if _rate_limited() or random.random() < FAKE_RATE_LIMIT_RATE:
+        _stats["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": "1"},
+            content={"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+        )
+
+    latency = FAKE_LATENCY
+    if random.random() < FAKE_SLOW_RATE:
+        _stats["slow"] += 1
+        latency = FAKE_SLOW_LATENCY
+    await asyncio.sleep(latency)
+
+    if random.random() < FAKE_ERROR_RATE:
+        _stats["errors"] += 1
+        return JSONResponse(status_code=500, content={"error": {"message": "Injected failure", "type": "server_error"}})
+
+    _stats["ok"] += 1
+    if _wants_both(body.get("messages", [])):
+        content = json.dumps({"strict": OPINION, "lenient": LENIENT_OPINION})
+    else:
+        content = json.dumps(OPINION)
+    return {
+        "id": f"chatcmpl-fake-{_stats['calls']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }
+        ],
+        "usage": {"prompt_tokens": 1200, "completion_tokens": 120, "total_tokens": 1320},
+    }
+
+
+@app.get("/stats")
+def stats():
+    return _stats
+
+
+@app.post("/stats/reset")
+def reset_stats():
+    for key in _stats:
+        _stats[key] = 0
+    _recent.clear()
+    return _stats
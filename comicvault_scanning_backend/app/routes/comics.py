@@ -32,12 +32,15 @@ async def grade_comic(
     dirs = storage.create_comic_directories(user_id, comic_id)
 
     # Save originals
-    original_paths = await storage.save_original_uploads(front, back, dirs["original"])
+    try:
+        original_paths = await storage.save_original_uploads(front, back, dirs["original"])
+    except storage.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
     # Preprocess images
     processed_paths = preprocessing.process_images(original_paths, dirs["processed"])
 
-    # Compute grades
+    # Compute grades (from the persisted q90 JPEGs, so scores stay as before)
     subgrades = grading.grade_comic(processed_paths)
 
     # Save analysis JSON
@@ -1,11 +1,66 @@
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Union
 
 import numpy as np
-from PIL import Image, ImageFilter
 
+from app.services import preprocessing
 
-def _image_score(path: Path) -> float:
+ImageSource = Union[Path, preprocessing.ImageHandle]
+
+
+def _stack_stats(stack: np.ndarray) -> np.ndarray:
+    """[edge strength, brightness] sums for an (N, H, W) uint8 stack.
+
+    Edges use the same 3x3 kernel as PIL's FIND_EDGES (8 * center minus the
+    8 neighbours, clipped to 0–255, border pixels passed through), computed
+    in int16 so there are no full-size float temporaries.
+    """
+    n, h, w = stack.shape
+    x = stack.astype(np.int16)
+
+    acc = x[:, 1:-1, 1:-1] * 9
+    for dy in range(3):
+        for dx in range(3):
+            acc -= x[:, dy:dy + h - 2, dx:dx + w - 2]
+    np.clip(acc, 0, 255, out=acc)
+
+    edge_sum = acc.sum(axis=(1, 2), dtype=np.int64)
+    edge_sum += stack[:, 0, :].sum(axis=1, dtype=np.int64) + stack[:, -1, :].sum(axis=1, dtype=np.int64)
+    edge_sum += stack[:, 1:-1, 0].sum(axis=1, dtype=np.int64) + stack[:, 1:-1, -1].sum(axis=1, dtype=np.int64)
+
+    brightness_sum = stack.sum(axis=(1, 2), dtype=np.int64)
+
+    return np.stack([edge_sum, brightness_sum], axis=1) / float(h * w)
+
+
+def _scores_from_stats(stats: np.ndarray) -> np.ndarray:
+    """Map a stack of image stats to 0.0–10.0 scores in one vectorized pass."""
+    edge_strength = stats[:, 0] / 255.0  # 0–1
+
+    # Brightness score: avoid too dark / too blown out
+    mean_brightness = stats[:, 1] / 255.0  # 0–1
+    brightness_score = 1.0 - np.abs(mean_brightness - 0.5) * 2  # peak at 0.5
+
+    raw_score = 0.6 * edge_strength + 0.4 * brightness_score
+    return np.round(np.clip(raw_score * 10.0, 0.0, 10.0), 1)
+
+
+def image_stats(image: ImageSource) -> np.ndarray:
+    """[mean edge strength, mean brightness] of one image, memoized on a handle.
+
+    A handle's existing decode is reused (grayscale at ~DECODE_MAX_DIM,
+    JPEGs DCT-decoded at reduced size).
+    """
+    return preprocessing.image_handle(image).derive("stats", lambda handle: _stack_stats(handle.gray()[None])[0])
+
+
+def _score_images(images: List[ImageSource]) -> List[float]:
+    """Score several images (e.g. front + back) as one batch; takes paths or ImageHandles."""
+    stats = np.stack([image_stats(image) for image in images])
+    return list(_scores_from_stats(stats))
+
+
+def _image_score(path: ImageSource) -> float:
     """Very simple heuristic scoring function.
 
     This is a placeholder so the pipeline runs end-to-end.
@@ -16,31 +71,16 @@ def _image_score(path: Path) -> float:
     - brightness distribution
     and maps that to a 0.0–10.0 scale.
     """
-    img = Image.open(path).convert("L")  # grayscale
-    arr = np.array(img, dtype=float)
-
-    # Edge strength via Laplacian-like filter
-    edges = img.filter(ImageFilter.FIND_EDGES)
-    edges_arr = np.array(edges, dtype=float)
-    edge_strength = edges_arr.mean() / 255.0  # 0–1
-
-    # Brightness score: avoid too dark / too blown out
-    mean_brightness = arr.mean() / 255.0  # 0–1
-    brightness_score = 1.0 - abs(mean_brightness - 0.5) * 2  # peak at 0.5
-
-    raw_score = (0.6 * edge_strength + 0.4 * brightness_score)
-    score_0_10 = max(0.0, min(10.0, raw_score * 10.0))
-    return round(score_0_10, 1)
+    return _score_images([path])[0]
 
 
-def grade_comic(processed_paths: Dict[str, Path]) -> Dict[str, float]:
+def grade_comic(processed_paths: Dict[str, ImageSource]) -> Dict[str, float]:
     """Compute subgrades and a final grade from processed images.
 
     For now, we derive subgrades from simple stats of the front/back images.
     This is intentionally transparent and easy to swap out later.
     """
-    front_score = _image_score(processed_paths["front"])
-    back_score = _image_score(processed_paths["back"])
+    front_score, back_score = _score_images([processed_paths["front"], processed_paths["back"]])
 
     # Derive fake-but-consistent subgrades from the two views
     corners = round((front_score * 0.6 + back_score * 0.4), 1)
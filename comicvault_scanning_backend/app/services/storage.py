@@ -1,4 +1,8 @@
+import asyncio
+import hashlib
 import json
+import os
+import uuid
 from pathlib import Path
 from typing import Dict, Tuple
 
@@ -7,6 +11,14 @@ STORAGE_ROOT = BASE_DIR / "storage"
 USERS_ROOT = STORAGE_ROOT / "users"
 TEMP_UPLOADS_ROOT = STORAGE_ROOT / "temp_uploads"
 
+# Uploads are copied to disk in chunks of this size, never read whole.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
 
 def create_comic_directories(user_id: str, comic_id: str) -> Dict[str, Path]:
     """Create the full directory tree for a given user's comic."""
@@ -28,16 +40,52 @@ def create_comic_directories(user_id: str, comic_id: str) -> Dict[str, Path]:
     }
 
 
-async def save_original_uploads(front_file, back_file, original_dir: Path) -> Dict[str, Path]:
-    """Save uploaded front/back images to the original/ folder."""
-    front_bytes = await front_file.read()
-    back_bytes = await back_file.read()
+async def stream_upload(upload, dest_path: Path, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[Path, str]:
+    """
+    Copy an UploadFile to dest_path in fixed-size chunks.
+    - hashes (sha256) and size-checks while streaming
+    - writes to a temp file under temp_uploads/, then renames into place
+    Returns (dest_path, sha256 hex digest).
+    """
+
+    TEMP_UPLOADS_ROOT.mkdir(parents=True, exist_ok=True)
+    tmp_path = TEMP_UPLOADS_ROOT / f"{uuid.uuid4().hex}.part"
+
+    digest = hashlib.sha256()
+    size = 0
+    fh = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
 
-    front_path = original_dir / "front_" + front_file.filename
-    back_path = original_dir / "back_" + back_file.filename
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"{upload.filename or 'upload'} exceeds the {max_bytes} byte upload limit")
+
+            digest.update(chunk)
+            await asyncio.to_thread(fh.write, chunk)
+
+        await asyncio.to_thread(fh.close)
+        await asyncio.to_thread(os.replace, tmp_path, dest_path)
+    except BaseException:
+        fh.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return dest_path, digest.hexdigest()
+
+
+async def save_original_uploads(front_file, back_file, original_dir: Path) -> Dict[str, Path]:
+    """Stream uploaded front/back images to the original/ folder."""
+    front_name = Path(front_file.filename or "front.jpg").name
+    back_name = Path(back_file.filename or "back.jpg").name
 
-    front_path.write_bytes(front_bytes)
-    back_path.write_bytes(back_bytes)
+    (front_path, _), (back_path, _) = await asyncio.gather(
+        stream_upload(front_file, original_dir / f"front_{front_name}"),
+        stream_upload(back_file, original_dir / f"back_{back_name}"),
+    )
 
     return {"front": front_path, "back": back_path}
 
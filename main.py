@@ -1,9 +1,47 @@
-from fastapi import FastAPI
+import os
+import asyncio
+import contextlib
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from app.routes import comics
+from app.services import cpu_pool, grading_cache, jobs, metrics, model_scheduler, openai_hybrid_grading, storage
+
+# Send `X-Profile: 1` on a request to get a pyinstrument profile of it
+# (requires PROFILING_ENABLED=1 and `pip install pyinstrument`).
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILES_ROOT = storage.STORAGE_ROOT / "profiles"
+
+
+async def warm_up() -> None:
+    """
+    The slow parts of startup: the openai SDK and its pooled client, and the
+    CPU pool's worker processes. Requests that arrive first still work
+    (clients are created on first use, the pool falls back to threads).
+    """
+    await openai_hybrid_grading.open_clients()
+    await asyncio.to_thread(cpu_pool.start)
+
 
-app = FastAPI(title="ComicVault Scanning Backend", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so /health answers as soon as the server
+    # is listening; /ready reports when warmup is done
+    app.state.warmup = asyncio.create_task(warm_up())
+    yield
+    with contextlib.suppress(Exception):
+        await app.state.warmup
+    # Stop grading workers so queued jobs don't outlive the app
+    await jobs.queue.stop()
+    await openai_hybrid_grading.close_clients()
+    cpu_pool.shutdown()
+
+
+app = FastAPI(title="ComicVault Scanning Backend", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,3 +68,55 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def readiness_check():
+    """200 once startup warmup has finished, 503 before (or if it failed)."""
+    warmup = getattr(app.state, "warmup", None)
+    if warmup is None or not warmup.done():
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    if warmup.cancelled() or warmup.exception() is not None:
+        error = "cancelled" if warmup.cancelled() else str(warmup.exception())
+        return JSONResponse(status_code=503, content={"status": "error", "detail": error})
+    return {"status": "ready"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Prometheus-style metrics for the grading pipeline."""
+    for stat, value in grading_cache.cache.stats().items():
+        metrics.CACHE_STATS.set(value, stat=stat)
+    metrics.JOB_QUEUE_DEPTH.set(jobs.queue.depth())
+    metrics.MODEL_QUEUED.set(model_scheduler.scheduler.queued())
+    for state, count in cpu_pool.depth().items():
+        metrics.CPU_POOL_TASKS.set(count, state=state)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+if PROFILING_ENABLED:
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if request.headers.get("x-profile") != "1":
+            return await call_next(request)
+
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            return await call_next(request)
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.stop()
+
+        PROFILES_ROOT.mkdir(parents=True, exist_ok=True)
+        name = request.url.path.strip("/").replace("/", "_") or "root"
+        profile_path = PROFILES_ROOT / f"{int(time.time() * 1000)}_{name}.html"
+        profile_path.write_text(profiler.output_html(), encoding="utf-8")
+        response.headers["X-Profile-Path"] = str(profile_path)
+        return response
+
+
+app.include_router(comics.router, prefix="/api/comics", tags=["comics"])